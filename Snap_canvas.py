@@ -1,15 +1,16 @@
 # 文件路径: ComfyUI/custom_nodes/ComfyUI-Snap_Processing/Snap_canvas.py
 
-from PyQt5.QtCore import QEventLoop
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtGui import QImage
+# PyQt5 与窗口模块只在第一次打开画布时导入，无界面环境也能加载本节点包
 import time
-import os
 import torch
 from PIL import Image
 import numpy as np
-from io import BytesIO
-from .ui.canvas_window import CanvasWindow
+from . import canvas_layout
+from . import output_writer
+from . import image_registry
+from . import instrumentation
+from . import tensor_precision
+from .instrumentation import logger
 
 
 class PyQtCanvasNode:
@@ -19,135 +20,277 @@ class PyQtCanvasNode:
             "required": {
                 "image": ("IMAGE",),  # 必需的图像输入
                 "seed": ("INT", {"default": 0, "min": 0, "max": 0xffffffffffffffff}),
+            },
+            "optional": {
+                # replay: 不打开窗口，直接按上次保存的布局合成
+                "mode": (["interactive", "replay"],),
+                # 布局按预设名保存，留空时按种子保存
+                "preset": ("STRING", {"default": ""}),
+                # 导出倍数：按原始像素重新渲染 N 倍画布尺寸的结果
+                "export_scale": ("INT", {"default": 1, "min": 1, "max": 8}),
+                # 在常驻的独立进程中打开画布，本进程不加载 Qt
+                "gui_process": ("BOOLEAN", {"default": False}),
+                # 兼容旧工作流：始终写到 canvas/output.png，而不是按内容命名
+                "fixed_filename": ("BOOLEAN", {"default": False}),
+                # png 可选压缩级别；tiff/bmp 不压缩，webp 为无损，npy 为原始数组；bmp 不保存 alpha
+                "output_format": (["png", "tiff", "bmp", "webp", "npy"],),
+                "compress_level": ("INT", {"default": 6, "min": 0, "max": 9}),
+                # 会话模式：批次的每一帧作为常驻多标签窗口中的一项，分别摆放、逐项确认
+                "session": ("BOOLEAN", {"default": False}),
+                # 输出精度：float16 / uint8 的 IMAGE 与 MASK 内存为 float32 的一半 / 四分之一
+                "precision": (tensor_precision.PRECISIONS,),
             }
         }
 
-    RETURN_TYPES = ("IMAGE", "INT", "STRING", "INT", "INT", "FLOAT")  # IMAGE, seed, path, x, y, scale_factor
-    RETURN_NAMES = ("image", "seed", "string", "X", "Y", "factor")
+    # IMAGE, seed, path, x, y, scale_factor, mask；MASK 与 Snapload 一致取 1 - 覆盖率，画布空白处为 1
+    RETURN_TYPES = ("IMAGE", "INT", "STRING", "INT", "INT", "FLOAT", "MASK")
+    RETURN_NAMES = ("image", "seed", "string", "X", "Y", "factor", "mask")
     FUNCTION = "activate_pyqt"
     CATEGORY = "Snap Processing"
 
-    def activate_pyqt(self, image, seed):
+    def activate_pyqt(self, image, seed, mode="interactive", preset="", export_scale=1, gui_process=False,
+                      fixed_filename=False, output_format="png", compress_level=6, session=False,
+                      precision="float32"):
         try:
-            # 使用用户提供的种子值
-            print(f"Received seed: {seed}")
-
-            # 将张量转换为 QImage
-            qimage = self.tensor_to_qimage(image)
-            print("Converted tensor to QImage")
-
-            # 运行 PyQt GUI 并阻塞主线程，直到用户完成操作
-            modified_image, x, y, scale_factor = self.run_pyqt_gui(qimage)
-            print("PyQt GUI closed")
-
-            # 将修改后的 QImage 转换为 NumPy 数组
-            numpy_array = self.qimage_to_numpy(modified_image)
-            print("Converted QImage to NumPy array")
+            with instrumentation.execution("PyQtCanvasNode"):
+                dtype = tensor_precision.dtype(precision)
+
+                # 使用用户提供的种子值
+                logger.debug("Received seed: %s", seed)
+                key = canvas_layout.layout_key(preset, seed)
+
+                if mode == "replay":
+                    output_tensor, mask, numpy_array, x, y, scale_factor = self.replay_layout(
+                        image, key, export_scale, dtype)
+                else:
+                    output_tensor, mask, numpy_array, x, y, scale_factor = self.run_interactive(
+                        image, key, export_scale, gui_process, session, dtype)
+
+                # 保存的是白底颜色加 alpha 的 RGBA，Snapload 读回的 IMAGE 不变、MASK 为实际覆盖范围。
+                # 交给后台线程编码保存；路径在文件完整落盘后才出现，Snapload 读取前会等待写入完成
+                with instrumentation.span("canvas.submit", numpy_array.nbytes):
+                    png_image_path = output_writer.WRITER.submit(
+                        numpy_array, filename="output" if fixed_filename else None,
+                        output_format=output_format, compress_level=compress_level)
+                logger.debug("图像将保存到 %s", png_image_path)
+
+                # 以路径为令牌在本进程内发布结果，同一进程中的 Snapload 直接取用张量；
+                # 与文件一致只含第一帧，批次输入时单独拷贝，避免整个批次被一直持有
+                if output_tensor.shape[0] == 1:
+                    published = (output_tensor[:1], mask[0])
+                else:
+                    published = (output_tensor[:1].clone(), mask[0].clone())
+                image_registry.REGISTRY.publish(png_image_path, published)
+
+                # 返回修改后的图像和其他参数
+                return (output_tensor, seed, png_image_path, x, y, scale_factor, mask)
+        except Exception as e:
+            logger.error("激活 PyQt 时出错: %s", e)
+            raise e
 
-            save_directory = os.path.join(os.getcwd(), "canvas")
+    def run_interactive(self, image, key, export_scale=1, gui_process=False, session=False,
+                        dtype=torch.float32):
+        if image.ndim == 3:
+            image = image[None]
 
-            # 如果目录不存在，则创建该目录
-            if not os.path.exists(save_directory):
-                os.makedirs(save_directory)
+        if session:
+            return self.run_session(image, key, export_scale, gui_process, dtype)
+        if gui_process:
+            return self.run_in_worker(image, key, export_scale, dtype)
 
-            # 使用固定文件名 'output.png'
-            png_image_filename = "output.png"
-            png_image_path = os.path.join(save_directory, png_image_filename)
+        # 将张量转换为 QImage；批次输入时只在窗口中摆放第一帧
+        with instrumentation.span("canvas.to_qimage") as converted:
+            qimage = self.tensor_to_qimage(image[0])
+            converted.nbytes = qimage.sizeInBytes()
 
-            # 保存图像
-            self.numpy_to_png(numpy_array, png_image_path)
-            print(f"已将图像保存到 {png_image_path}")
+        # 运行 PyQt GUI 并阻塞主线程，直到用户完成操作
+        modified_image, x, y, scale_factor, layout, export_image = self.run_pyqt_gui(qimage, export_scale)
 
-            # 返回修改后的图像和其他参数
-            return (self.qimage_to_tensor(modified_image), seed, png_image_path, x, y, scale_factor)
-        except Exception as e:
-            print(f"激活 PyQt 时出错: {e}")
-            raise e
+        if layout is not None:
+            canvas_layout.save_layout(key, layout)
 
-    def run_pyqt_gui(self, input_image):
+        # 将修改后的 QImage 转换为白底 RGBA 数组；高分辨率导出时直接使用导出结果
+        if export_image is not None:
+            numpy_array = export_image
+        else:
+            with instrumentation.span("canvas.to_array") as converted:
+                numpy_array = self.qimage_to_rgba(modified_image)
+                converted.nbytes = numpy_array.nbytes
+
+        output_tensor, mask = self.canvas_outputs(image, numpy_array, layout, export_scale, dtype)
+        return output_tensor, mask, numpy_array, x, y, scale_factor
+
+    def run_in_worker(self, image, key, export_scale=1, dtype=torch.float32):
+        from . import canvas_process
+        from .ui import image_bridge
+
+        with instrumentation.span("canvas.to_array") as converted:
+            frame = image_bridge.tensor_to_uint8(image[0])
+            converted.nbytes = frame.nbytes
+
+        # 第一帧经共享内存交给窗口进程，结果以白底 RGBA 的 uint8 数组返回
+        numpy_array, x, y, scale_factor, layout, export_image = canvas_process.WORKER.open_canvas(
+            frame, export_scale)
+
+        if layout is not None:
+            canvas_layout.save_layout(key, layout)
+        if export_image is not None:
+            numpy_array = export_image
+
+        output_tensor, mask = self.canvas_outputs(image, numpy_array, layout, export_scale, dtype)
+        return output_tensor, mask, numpy_array, x, y, scale_factor
+
+    def run_session(self, image, key, export_scale=1, gui_process=False, dtype=torch.float32):
+        from .ui import image_bridge
+
+        # 每一帧单独摆放，全部确认后各帧结果拼成一个批次
+        if gui_process:
+            from . import canvas_process
+
+            with instrumentation.span("canvas.to_array") as converted:
+                frames = np.stack([image_bridge.tensor_to_uint8(frame) for frame in image])
+                converted.nbytes = frames.nbytes
+            results = canvas_process.WORKER.open_session(frames, export_scale)
+            del frames
+            arrays = [export_image if export_image is not None else modified_image
+                      for modified_image, _, _, _, _, export_image in results]
+        else:
+            results = self.run_pyqt_session(image, export_scale)
+            with instrumentation.span("canvas.to_array") as converted:
+                arrays = [export_image if export_image is not None else self.qimage_to_rgba(modified_image)
+                          for modified_image, _, _, _, _, export_image in results]
+                converted.nbytes = sum(array.nbytes for array in arrays)
+
+        if any(array.shape != arrays[0].shape for array in arrays):
+            raise ValueError("会话中各帧的画布尺寸不一致，无法合成一个批次")
+
+        # 保存的文件和布局都取第一帧，与非会话模式一致
+        _, x, y, scale_factor, layout, _ = results[0]
+        if layout is not None:
+            canvas_layout.save_layout(key, layout)
+
+        with instrumentation.span("canvas.to_tensor") as converted:
+            height, width = arrays[0].shape[:2]
+            output_tensor = torch.empty((len(arrays), height, width, 3), dtype=dtype)
+            mask = torch.empty((len(arrays), height, width), dtype=dtype)
+            for i, array in enumerate(arrays):
+                image_bridge.write_uint8(array[..., :3], output_tensor[i])
+                image_bridge.write_inverted_alpha(array[..., 3], mask[i])
+            converted.nbytes = output_tensor.nbytes + mask.nbytes
+        return output_tensor, mask, arrays[0], x, y, scale_factor
+
+    def canvas_outputs(self, image, numpy_array, layout, export_scale=1, dtype=torch.float32):
+        from .ui import image_bridge
+
+        # 同一布局通过一次批量仿射变换应用到所有帧，覆盖率对每帧相同
+        if image.shape[0] > 1 and layout is not None:
+            with instrumentation.span("canvas.render_batch") as rendered:
+                output_tensor, coverage = canvas_layout.render_layout(
+                    image, canvas_layout.scale_layout(layout, export_scale), dtype=dtype)
+                rendered.nbytes = output_tensor.nbytes
+            return output_tensor, self.coverage_mask(coverage, image.shape[0], dtype)
+
+        with instrumentation.span("canvas.to_tensor") as converted:
+            output_tensor, mask = image_bridge.rgba_to_tensors(numpy_array, dtype)
+            converted.nbytes = output_tensor.nbytes + mask.nbytes
+        return output_tensor, mask
+
+    def coverage_mask(self, coverage, batch, dtype=torch.float32):
+        # MASK = 1 - 覆盖率，各帧相同；逐帧拷贝成独立的存储，下游节点原地修改某一帧时不影响其他帧
+        mask = tensor_precision.convert(1.0 - coverage, dtype)
+        return mask.expand(batch, -1, -1).contiguous()
+
+    def replay_layout(self, image, key, export_scale=1, dtype=torch.float32):
+        layout = canvas_layout.get_layout(key)
+        if layout is None:
+            raise ValueError(f"没有找到已保存的画布布局: {key}")
+
+        if image.ndim == 3:
+            image = image[None]
+        with instrumentation.span("canvas.render_batch") as rendered:
+            output_tensor, coverage = canvas_layout.render_layout(
+                image, canvas_layout.scale_layout(layout, export_scale), dtype=dtype)
+            rendered.nbytes = output_tensor.nbytes
+        mask = self.coverage_mask(coverage, image.shape[0], dtype)
+
+        with instrumentation.span("canvas.to_array") as converted:
+            # 各精度都四舍五入到 8 位，保存的文件与 IMAGE 输出相差不超过半级
+            frame = tensor_precision.convert(output_tensor[0], torch.uint8)
+            alpha = tensor_precision.convert(coverage, torch.uint8)
+            numpy_array = torch.cat([frame, alpha[..., None]], dim=-1).cpu().numpy()
+            converted.nbytes = numpy_array.nbytes
+
+        return output_tensor, mask, numpy_array, int(layout["x"]), int(layout["y"]), layout["scale"]
+
+    def run_pyqt_gui(self, input_image, export_scale=1):
         try:
+            from PyQt5.QtWidgets import QApplication
+            from .ui.canvas_window import CanvasWindow
+
             app = QApplication.instance()
             if app is None:
                 app = QApplication([])  # 创建全局应用程序
 
             # 始终创建一个新的 CanvasWindow 实例
-            dialog = CanvasWindow(input_image)
+            dialog = CanvasWindow(input_image, export_scale=export_scale)
             dialog.save_signal.connect(self.on_save)
             dialog.close_signal.connect(self.on_close)
 
-            print("PyQt CanvasWindow shown")
-            dialog.exec_()  # 阻塞，直到对话框关闭
+            # 阻塞，直到对话框关闭；保存时的渲染耗时从等待时间中扣除，单独记为 canvas.render
+            start = time.perf_counter()
+            dialog.exec_()
+            elapsed = time.perf_counter() - start
+            instrumentation.record("canvas.gui_wait", elapsed - dialog.render_seconds, wait=True)
+            instrumentation.record("canvas.render", dialog.render_seconds, dialog.render_bytes)
 
-            print("Dialog closed")
             modified_image = dialog.get_modified_image()
             x = dialog.get_top_left_x()
             y = dialog.get_top_left_y()
             scale_factor = dialog.get_scale_factor()
+            layout = dialog.get_layout()
+            export_image = dialog.get_export_image()
             dialog.deleteLater()  # 确保窗口被正确销毁
-            print("CanvasWindow deleted")
-            return modified_image, x, y, scale_factor
+            return modified_image, x, y, scale_factor, layout, export_image
         except Exception as e:
-            print(f"Error in run_pyqt_gui: {e}")
+            logger.error("Error in run_pyqt_gui: %s", e)
             raise e
 
-    def on_save(self):
-        print("Image saved successfully")
+    def run_pyqt_session(self, image, export_scale=1):
+        from .ui import canvas_session
 
-    def on_close(self):
-        print("Window closed")
+        # 各帧作为会话窗口中的一项，等到全部被确认；画布可能晚于本次调用才销毁，传入不引用张量内存的拷贝
+        qimages = [self.tensor_to_qimage(frame).copy() for frame in image]
+        start = time.perf_counter()
+        results = canvas_session.get_session().request(qimages, export_scale)
+        elapsed = time.perf_counter() - start
+        render_seconds = sum(result["render_seconds"] for result in results)
+        instrumentation.record("canvas.gui_wait", elapsed - render_seconds, wait=True)
+        instrumentation.record("canvas.render", render_seconds, sum(result["render_bytes"] for result in results))
 
-    def tensor_to_qimage(self, tensor):
-        if tensor.ndim == 4:
-            tensor = tensor.squeeze(0)
-        if tensor.ndim != 3:
-            raise ValueError(f"Expected tensor with 3 dimensions, but got {tensor.ndim} dimensions.")
-
-        if tensor.shape[0] in [1, 3, 4]:
-            pass
-        elif tensor.shape[2] in [1, 3, 4]:
-            tensor = tensor.permute(2, 0, 1)
-        else:
-            raise ValueError("Tensor has unsupported shape.")
+        return [(result["image"], result["x"], result["y"], result["scale"], result["layout"], result["export"])
+                for result in results]
 
-        num_channels = tensor.shape[0]
-        if num_channels == 1:
-            tensor = tensor.repeat(3, 1, 1)
-        elif num_channels == 2:
-            tensor = torch.cat([tensor, tensor[0:1, :, :]], dim=0)
-        elif num_channels == 4:
-            tensor = tensor[:3, :, :]
-        elif num_channels != 3:
-            raise ValueError(f"Unsupported number of channels: {num_channels}")
+    def on_save(self):
+        logger.debug("Image saved successfully")
 
-        image_data = tensor.mul(255).byte().cpu().numpy()
-        image_data = image_data.transpose(1, 2, 0)
+    def on_close(self):
+        logger.debug("Window closed")
 
-        pil_image = Image.fromarray(image_data, 'RGB')
-        qimage = self.pil_image_to_qimage(pil_image)
-        return qimage
+    def tensor_to_qimage(self, tensor):
+        from .ui import image_bridge
+        return image_bridge.tensor_to_qimage(tensor)
 
     def qimage_to_tensor(self, qimage):
-        qimage = qimage.convertToFormat(QImage.Format_RGB888)
-        width = qimage.width()
-        height = qimage.height()
-
-        ptr = qimage.bits()
-        ptr.setsize(qimage.byteCount())
-        image_np = np.array(ptr).reshape((height, width, 3))
-
-        tensor = torch.from_numpy(image_np).permute(2, 0, 1).float() / 255.0
-        return tensor
+        from .ui import image_bridge
+        return image_bridge.qimage_to_tensor(qimage)
 
     def qimage_to_numpy(self, qimage):
-        qimage = qimage.convertToFormat(QImage.Format_RGB888)
-        width = qimage.width()
-        height = qimage.height()
-
-        ptr = qimage.bits()
-        ptr.setsize(qimage.byteCount())
-        image_np = np.array(ptr).reshape((height, width, 3))
+        from .ui import image_bridge
+        return image_bridge.qimage_to_numpy(qimage)
 
-        return image_np
+    def qimage_to_rgba(self, qimage):
+        from .ui import image_bridge
+        return image_bridge.qimage_to_rgba(qimage)
 
     def numpy_to_png(self, numpy_array, save_path):
         if numpy_array.dtype != np.uint8:
@@ -157,8 +300,5 @@ class PyQtCanvasNode:
         image.save(save_path, format='PNG')
 
     def pil_image_to_qimage(self, pil_image):
-        buffer = BytesIO()
-        pil_image.save(buffer, format="PNG")
-        image_bytes = buffer.getvalue()
-        qimage = QImage.fromData(image_bytes, "PNG")
-        return qimage
+        from .ui import image_bridge
+        return image_bridge.numpy_to_qimage(np.asarray(pil_image.convert("RGB")))
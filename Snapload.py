@@ -1,17 +1,251 @@
 import torch
+import glob
 import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Iterable
 from PIL import Image, ImageOps
 import numpy as np
 import folder_paths
 import os  # 引入 os 库用于创建目录
+from . import output_writer
+from . import image_registry
+from . import instrumentation
+from . import tensor_precision
+from .ui import image_bridge
+
+# 按 stat 信息缓存文件哈希，文件未变化时 IS_CHANGED 无需重新读取
+_FINGERPRINTS = OrderedDict()
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 同一次提示中 VALIDATE_INPUTS / IS_CHANGED / load_image 共用的路径解析结果
+_RESOLVED_PATHS = OrderedDict()
+
+# 画布结果按内容命名，每次提示都会产生新路径；以上两个缓存按最近使用保留固定条数
+_MAX_CACHED_PATHS = 4096
+_path_cache_lock = threading.Lock()
+
+
+def _cache_get(cache, key):
+    with _path_cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value):
+    with _path_cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _MAX_CACHED_PATHS:
+            cache.popitem(last=False)
+
+# 批量模式下从目录中收集的文件类型
+_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff", ".npy"}
+
+# EXIF 方向标签中需要交换宽高的取值
+_EXIF_ORIENTATION = 0x0112
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def _file_fingerprint(image_path):
+    stat = os.stat(image_path)
+    key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    cached = _cache_get(_FINGERPRINTS, image_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    # 分块读取计算哈希，避免一次性把大文件读入内存
+    with instrumentation.span("load.hash", stat.st_size):
+        m = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                m.update(chunk)
+        digest = m.digest().hex()
+
+    _cache_put(_FINGERPRINTS, image_path, (key, digest))
+    return digest
+
+
+def _wait_for_write(image_path):
+    # 画布节点可能仍在后台写出该文件，等它完整落盘后再读取
+    if output_writer.WRITER.is_pending(image_path):
+        with instrumentation.span("load.wait_write", wait=True):
+            output_writer.WRITER.wait(image_path)
+    else:
+        output_writer.WRITER.wait(image_path)
+    return image_path
+
+
+def _oriented_size(i):
+    # 不解码像素，仅根据 EXIF 方向得到 exif_transpose 之后的尺寸
+    width, height = i.size
+    if i.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def _fit_size(size, max_side):
+    # 按最长边不超过 max_side 等比缩小，0 表示不限制
+    width, height = size
+    longest = max(width, height)
+    if max_side <= 0 or longest <= max_side:
+        return size
+    scale = max_side / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class _ArrayImage:
+    # 把 .npy 的内存映射包装成 Snapload 用到的那部分 PIL.Image 接口，
+    # _decode_into 通过 np.asarray 直接从映射读取像素，不经过解码和中间拷贝
+    def __init__(self, array):
+        self.array = array
+        self.size = (array.shape[1], array.shape[0])
+        self.mode = "RGBA" if array.shape[2] == 4 else "RGB"
+
+    def getbands(self):
+        return tuple(self.mode)
+
+    def resize(self, size, resample):
+        return Image.fromarray(np.asarray(self.array)).resize(size, resample)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.array = None
+
+
+def _is_glob(path):
+    # 含通配符且不是现有文件时才按通配符展开，"shot [1].png" 这类文件名照常作为单个文件读取
+    return any(c in path for c in "*?[") and not os.path.exists(path)
+
+
+def _is_npy(image_path):
+    return str(image_path).lower().endswith(".npy")
+
+
+def _image_size(image_path, max_side=0):
+    # 只读取文件头得到解码后的尺寸
+    if _is_npy(image_path):
+        height, width = np.load(image_path, mmap_mode="r").shape[:2]
+        return _fit_size((width, height), max_side)
+    with Image.open(image_path) as i:
+        return _fit_size(_oriented_size(i), max_side)
+
+
+def _open_npy(image_path, max_side=0):
+    array = np.load(image_path, mmap_mode="r")
+    size = (array.shape[1], array.shape[0])
+    target = _fit_size(size, max_side)
+    if array.dtype == np.uint8 and array.ndim == 3 and array.shape[2] in (3, 4) and target == size:
+        return _ArrayImage(array)
+
+    # 其他布局或需要缩小时转成 PIL 图像处理
+    i = Image.fromarray(np.asarray(array))
+    return i.resize(target, Image.LANCZOS) if i.size != target else i
+
+
+def _open_image(image_path, max_side=0):
+    if _is_npy(image_path):
+        return _open_npy(image_path, max_side)
+
+    i = Image.open(image_path)
+    target = _fit_size(_oriented_size(i), max_side)
+
+    # JPEG 可在 DCT 阶段直接以 1/2~1/8 的比例解码，不必先解出全尺寸
+    if i.format == "JPEG" and target != _oriented_size(i):
+        i.draft(None, _fit_size(i.size, max_side))
+
+    i = ImageOps.exif_transpose(i)
+
+    if i.size != target:
+        # 其他格式先用整数倍 reduce 快速缩小，再精确缩放到目标尺寸
+        factor = min(i.width // target[0], i.height // target[1])
+        if factor >= 2:
+            i = i.reduce(factor)
+        if i.size != target:
+            i = i.resize(target, Image.LANCZOS)
+    return i
+
+
+class DecodedImageCache:
+    # 已解码 IMAGE/MASK 张量的 LRU 缓存，按总字节数淘汰
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, tensors):
+        nbytes = sum(t.numel() * t.element_size() for t in tensors)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (tensors, nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 缓存上限可通过环境变量 SNAP_LOAD_CACHE_BYTES 配置，设为 0 即关闭
+DECODED_CACHE = DecodedImageCache(int(os.environ.get("SNAP_LOAD_CACHE_BYTES", 1024 ** 3)))
+
 
 class Snapload:
     @classmethod
     def INPUT_TYPES(s):
         return {"required":
                     {"image": ("STRING", {"default": r"请转换为输入并SnapCanvas的string输出"})},
+                "optional":
+                    {
+                        # 批量模式：image 为目录、通配符或多行路径时，尺寸不一致的图像填充或缩放到统一尺寸
+                        "batch_resize": (["pad", "resize"],),
+                        "workers": ("INT", {"default": 4, "min": 1, "max": 64}),
+                        # 最长边上限，0 为原尺寸解码
+                        "max_side": ("INT", {"default": 0, "min": 0, "max": 16384}),
+                        # 输出精度：float16 / uint8 按原精度直接解码，缓存占用为 float32 的一半 / 四分之一
+                        "precision": (tensor_precision.PRECISIONS,),
+                    },
                 }
 
     CATEGORY = "Snap Processing"
@@ -19,29 +253,160 @@ class Snapload:
     RETURN_TYPES = ("IMAGE", "MASK")
     FUNCTION = "load_image"
     
-    def load_image(self, image):
+    def load_image(self, image, batch_resize="pad", workers=4, max_side=0, precision="float32"):
+        with instrumentation.execution("Snapload"):
+            return Snapload._load(image, batch_resize, workers, max_side, precision)
+
+    def _load(image, batch_resize="pad", workers=4, max_side=0, precision="float32"):
+        dtype = tensor_precision.dtype(precision)
+
+        # Snap Canvas 在本进程发布的结果直接返回原张量，不读文件；令牌已被淘汰时照常读文件
+        if max_side == 0:
+            published = image_registry.REGISTRY.fetch(image)
+            if published is not None:
+                return tuple(tensor_precision.convert(t, dtype) for t in published)
+
+        if Snapload._is_batch(image):
+            return Snapload._load_batch(Snapload._resolve_batch(image), batch_resize, workers, max_side, dtype)
+
         # 调用 _resolve_path 来获取图像路径
         image_path = Snapload._resolve_path(image)
 
+        # 文件内容未变化时直接返回缓存的张量
+        cache_key = (_file_fingerprint(image_path), max_side, dtype)
+        cached = DECODED_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with instrumentation.span("load.decode") as decoded:
+            result = Snapload._decode_image(image_path, max_side, dtype)
+            decoded.nbytes = sum(t.nbytes for t in result)
+        DECODED_CACHE.put(cache_key, result)
+        return result
+
+    def _decode_image(image_path, max_side=0, dtype=torch.float32):
         # 打开并处理图像
-        i = Image.open(image_path)
-        i = ImageOps.exif_transpose(i)
-        image = i.convert("RGB")
-        image = np.array(image).astype(np.float32) / 255.0
-        image = torch.from_numpy(image)[None,]
-        
+        i = _open_image(image_path, max_side)
+        width, height = i.size
+
+        # 预先分配输出张量，解码结果直接写入
+        image = torch.empty((1, height, width, 3), dtype=dtype)
+
         # 如果有 Alpha 通道，则生成掩码
         if 'A' in i.getbands():
-            mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
-            mask = 1. - torch.from_numpy(mask)
+            mask = torch.empty((height, width), dtype=dtype)
+            Snapload._decode_into(i, image[0], mask)
         else:
             # 否则生成一个全为零的掩码
-            mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
+            Snapload._decode_into(i, image[0])
+            mask = torch.zeros((64, 64), dtype=dtype, device="cpu")
         
         return (image, mask)
 
-    # 将图像路径解析为相对路径，默认为指定的路径
-    def _resolve_path(image) -> Path:
+    def _decode_into(i, image_out, mask_out=None):
+        # RGB/RGBA 直接读取像素，其余模式才转换；按输出张量的精度原地写入像素和 1 - alpha
+        if i.mode in ("RGB", "RGBA"):
+            pixels = np.asarray(i)
+            rgb = pixels[..., :3]
+            alpha = pixels[..., 3] if mask_out is not None else None
+        else:
+            rgb = np.asarray(i.convert("RGB"))
+            alpha = np.asarray(i.getchannel('A')) if mask_out is not None else None
+
+        image_bridge.write_uint8(rgb, image_out)
+
+        if alpha is not None:
+            image_bridge.write_inverted_alpha(alpha, mask_out)
+
+    def _load_batch(image_paths, batch_resize, workers, max_side=0, dtype=torch.float32):
+        # 连接的输入不经过 VALIDATE_INPUTS，空目录或无匹配的通配符也可能走到这里
+        if not image_paths:
+            raise ValueError("No images found for batch input")
+
+        cache_key = (Snapload._batch_fingerprint(image_paths), batch_resize, max_side, dtype)
+        cached = DECODED_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 先只读取文件头确定尺寸，一次性分配整个批次的输出张量
+        sizes = [_image_size(image_path, max_side) for image_path in image_paths]
+
+        if batch_resize == "resize":
+            width, height = sizes[0]
+        else:
+            width = max(w for w, _ in sizes)
+            height = max(h for _, h in sizes)
+
+        count = len(image_paths)
+        images = torch.zeros((count, height, width, 3), dtype=dtype)
+        masks = torch.zeros((count, height, width), dtype=dtype)
+
+        def decode(index):
+            with _open_image(image_paths[index], max_side) as i:
+                if batch_resize == "resize" and i.size != (width, height):
+                    i = i.resize((width, height), Image.LANCZOS)
+
+                w, h = i.size
+                if (w, h) != (width, height):
+                    # 填充区域视为透明
+                    masks[index].fill_(tensor_precision.full_scale(dtype))
+                    masks[index, :h, :w] = 0.0
+
+                if 'A' in i.getbands():
+                    Snapload._decode_into(i, images[index, :h, :w], masks[index, :h, :w])
+                else:
+                    Snapload._decode_into(i, images[index, :h, :w])
+
+        # PIL 解码时会释放 GIL，线程池即可并行解码
+        with instrumentation.span("load.decode_batch", images.nbytes + masks.nbytes):
+            with ThreadPoolExecutor(max_workers=min(workers, count)) as pool:
+                list(pool.map(decode, range(count)))
+
+        result = (images, masks)
+        DECODED_CACHE.put(cache_key, result)
+        return result
+
+    def _is_batch(image):
+        if not image:
+            return False
+        if "\n" in image.strip():
+            return True
+        path = folder_paths.get_annotated_filepath(image)
+        return _is_glob(path) or Path(path).is_dir()
+
+    def _resolve_batch(image) -> Iterable[Path]:
+        # 每次都重新列出目录和通配符：连接的输入不经过 VALIDATE_INPUTS，缓存的列表会漏掉之后新增的文件；
+        # 列目录的开销相对解码可以忽略
+        image_paths = []
+        for entry in image.splitlines():
+            entry = entry.strip()
+            if not entry:
+                continue
+            path = folder_paths.get_annotated_filepath(entry)
+            if _is_glob(path):
+                image_paths.extend(sorted(glob.glob(path)))
+            elif os.path.isdir(path):
+                image_paths.extend(sorted(
+                    str(p) for p in Path(path).iterdir() if p.suffix.lower() in _IMAGE_EXTENSIONS
+                ))
+            else:
+                image_paths.append(path)
+
+        image_paths = [Path(p).resolve() for p in image_paths]
+        return [_wait_for_write(p) for p in image_paths]
+
+    def _batch_fingerprint(image_paths):
+        m = hashlib.sha256()
+        for image_path in image_paths:
+            m.update(_file_fingerprint(image_path).encode())
+        return m.digest().hex()
+
+    # 将图像路径解析为相对路径，默认为指定的路径；refresh=True 时忽略缓存重新解析
+    def _resolve_path(image, refresh=False) -> Path:
+        cached = None if refresh else _cache_get(_RESOLVED_PATHS, image)
+        if cached is not None:
+            return _wait_for_write(cached)
+
         # 如果未提供图像路径，则使用默认路径
         if not image:
             default_path = Path("custom_nodes/ComfyUI-Snap_Processing/save/output.png").resolve()
@@ -54,16 +419,21 @@ class Snapload:
             os.makedirs(save_directory)
 
         # 返回默认路径或解析后的路径
-        return default_path
+        _cache_put(_RESOLVED_PATHS, image, default_path)
+        return _wait_for_write(default_path)
 
     @classmethod
-    def IS_CHANGED(s, image):
+    def IS_CHANGED(s, image, **kwargs):
+        generation = image_registry.REGISTRY.generation(image)
+        if generation is not None:
+            return f"registry:{generation}"
+
+        if Snapload._is_batch(image):
+            return Snapload._batch_fingerprint(Snapload._resolve_batch(image))
+
         # 获取图像路径并计算其哈希值，判断是否改变
         image_path = Snapload._resolve_path(image)
-        m = hashlib.sha256()
-        with open(image_path, 'rb') as f:
-            m.update(f.read())
-        return m.digest().hex()
+        return _file_fingerprint(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(s, image):
@@ -71,8 +441,21 @@ class Snapload:
         if image is None:
             return True
 
-        # 验证图像路径是否存在
-        image_path = Snapload._resolve_path(image)
+        # 已发布的令牌不必等待文件写完
+        if image_registry.REGISTRY.generation(image) is not None:
+            return True
+
+        if Snapload._is_batch(image):
+            image_paths = Snapload._resolve_batch(image)
+            if not image_paths:
+                return "No images found: {}".format(image)
+            missing = [str(p) for p in image_paths if not p.exists()]
+            if missing:
+                return "Invalid image path: {}".format(", ".join(missing))
+            return True
+
+        # 验证图像路径是否存在；每个新提示先经过这里，借此刷新路径缓存
+        image_path = Snapload._resolve_path(image, refresh=True)
         if not image_path.exists():
             return "Invalid image path: {}".format(image_path)
 
@@ -1,44 +1,335 @@
+import json
+import re
+import string
+
 import torch
 
+from . import instrumentation
+
+# 每个归约后元素的临时内存估算：float32 均值/int32 求和 + bool 掩码
+_BYTES_PER_ELEMENT = 5
+
+# 按维求和会先把 bool 掩码整体转成 int64 副本：阈值化的临时内存释放后，还有掩码本身和这份副本
+_SUM_BYTES_PER_ELEMENT = 1 + 8
+
+
+def _blocks(batch, height, row_elements, budget_bytes, element_bytes=_BYTES_PER_ELEMENT):
+    # 按内存预算切分：整帧放得下时按帧分块，否则逐帧按行带扫描
+    row_bytes = row_elements * element_bytes
+    rows_per_band = max(1, min(height, budget_bytes // row_bytes))
+    if rows_per_band == height:
+        frames_per_chunk = max(1, budget_bytes // (row_bytes * height))
+    else:
+        frames_per_chunk = 1
+
+    for start in range(0, batch, frames_per_chunk):
+        for top in range(0, height, rows_per_band):
+            yield slice(start, start + frames_per_chunk), slice(top, top + rows_per_band)
+
+
+def _slice_sum(values, dim, accumulator):
+    # 逐切片累加到更宽的类型，只生成一个归约后大小的累加张量；比 sum(dtype=...) 快数倍
+    total = values.select(dim, 0).to(accumulator, copy=True)
+    for i in range(1, values.shape[dim]):
+        total += values.select(dim, i)
+    return total
+
+
+def _threshold(values, dim, color_choice):
+    # 沿 dim 求均值后按 0.5 阈值二值化；二值/uint8/float16 输入直接比较累加和，不生成 float32 的输入副本
+    count = values.shape[dim]
+    if values.dtype == torch.bool:
+        if count == 1:
+            white = values.squeeze(dim)
+            return torch.logical_not(white) if color_choice == "black" else white
+        total, limit = values.sum(dim=dim, dtype=torch.int32) * 2, count
+    elif values.dtype == torch.uint8:
+        if count == 1:
+            total, limit = values.squeeze(dim), 128
+        else:
+            # 均值 ≥ 127.5 等价于整数和 ≥ ceil(255 * count / 2)；和不超过 int16 范围时用 int16 累加
+            accumulator = torch.int16 if 255 * count <= torch.iinfo(torch.int16).max else torch.int32
+            total, limit = _slice_sum(values, dim, accumulator), (255 * count + 1) // 2
+    elif values.dtype == torch.float16:
+        # 与 0.5 * count 比较，不必除法；和小于 4 时 float16 的间隔不超过 2^-9，比 8 位像素的步长还细，
+        # 直接用 float16 累加，项数更多时才用 float32 累加
+        accumulator = torch.float16 if count <= 4 else torch.float32
+        total = values.squeeze(dim) if count == 1 else _slice_sum(values, dim, accumulator)
+        limit = 0.5 * count
+    else:
+        total = values.squeeze(dim) if count == 1 else torch.mean(values, dim=dim)
+        limit = 0.5
+
+    if color_choice == "black":
+        return total < limit
+    return total >= limit
+
+
+def _parse_palette(text):
+    # 调色板写法："#ff0000, #00ff00" ，逗号、空格或换行分隔
+    colors = []
+    for token in re.split(r"[\s,;]+", text.strip()):
+        if not token:
+            continue
+        value = token.lstrip("#").lower()
+        if len(value) != 6 or any(c not in string.hexdigits for c in value):
+            raise ValueError(f"无效的调色板颜色: {token}")
+        colors.append(value)
+    return colors
+
+
+def _as_rgb(values):
+    if values.dtype == torch.uint8:
+        values = values.float() / 255.0
+    else:
+        values = values.float()
+    if values.shape[-1] == 1:
+        return values.expand(*values.shape[:-1], 3)
+    return values[..., :3]
+
+
+def _palette_index(values, table, tolerance):
+    # 最近颜色: |p - c|² = |p|² - 2p·c + |c|²，只需一次矩阵乘即可比较所有类别
+    pixels = _as_rgb(values)
+    scores = torch.matmul(pixels, table.T).mul_(-2).add_((table * table).sum(dim=1))
+    best, index = scores.min(dim=-1)
+
+    if tolerance > 0:
+        distance = best.add_((pixels * pixels).sum(dim=-1))
+        index[distance > (tolerance / 255.0) ** 2] = table.shape[0]
+    return index
+
+
+def _bin_index(values, bins):
+    gray_image = _as_rgb(values).mean(dim=-1)
+    return gray_image.mul_(bins).long().clamp_(0, bins - 1)
+
+
 class AreaCalculator:
     @classmethod
     def INPUT_TYPES(s):
         return {
             "required": {
                 "image": ("IMAGE",),  
-                "color_choice": (["black", "white"],),  
+                "color_choice": (["black", "white", "palette"],),  
+            },
+            "optional": {
+                "per_image": ("BOOLEAN", {"default": False}),
+                "chunk_mb": ("INT", {"default": 256, "min": 1, "max": 65536}),
+                "statistics": ("BOOLEAN", {"default": False}),
+                "palette": ("STRING", {"default": "", "multiline": True}),
+                "tolerance": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 442.0, "step": 1.0}),
+                "bins": ("INT", {"default": 8, "min": 1, "max": 256}),
             },
         }
 
-    RETURN_TYPES = ("INT", "INT")  
-    RETURN_NAMES = ("面积","占比%")
+    RETURN_TYPES = ("INT", "INT", "INT", "INT", "STRING", "STRING")
+    RETURN_NAMES = ("面积","占比%","逐帧面积","逐帧占比%","统计","类别统计")
+    OUTPUT_IS_LIST = (False, False, True, True, False, False)
     FUNCTION = "calculate_area"  
     CATEGORY = "Snap Processing"  
 
-    def calculate_area(self, image, color_choice):
+    def calculate_area(self, image, color_choice, per_image=False, chunk_mb=256, statistics=False,
+                       palette="", tolerance=0.0, bins=8):
+        if color_choice == "palette":
+            stage = "palette"
+        elif statistics:
+            stage = "statistics"
+        else:
+            stage = "per_image" if per_image else "combined"
 
-        gray_image = torch.mean(image, dim=0)  
+        with instrumentation.execution("AreaCalculator"), instrumentation.span(f"area.{stage}", image.nbytes):
+            return self.measure_area(image, color_choice, per_image, chunk_mb, statistics, palette, tolerance, bins)
 
-        if color_choice == "black":
+    def measure_area(self, image, color_choice, per_image=False, chunk_mb=256, statistics=False,
+                     palette="", tolerance=0.0, bins=8):
+        # MASK 形状 (B, H, W) 视为单通道图像
+        if image.ndim == 3:
+            image = image.unsqueeze(-1)
 
-            mask = gray_image < 0.5
-        else:
+        if color_choice == "palette":
+            return self.calculate_palette(image, palette, tolerance, bins, chunk_mb)
 
-            mask = gray_image >= 0.5
+        # 统计模式按帧阈值化，面积与区域统计共用同一个掩码
+        if statistics:
+            return self.calculate_statistics(image, color_choice, chunk_mb)
 
+        if per_image:
+            return self.calculate_area_per_image(image, color_choice, chunk_mb)
 
-        color_area = torch.sum(mask).item() 
+        color_area, total_area = self.combined_area(image, color_choice, chunk_mb * 1024 * 1024)
 
 
-        color_area = round(color_area)
+        color_ratio = int((color_area / total_area) * 100)
 
+        return (int(color_area), color_ratio, [int(color_area)], [color_ratio], "", "")
 
-        total_area = gray_image.numel()
+    def calculate_area_per_image(self, image, color_choice, chunk_mb):
+        areas = self.frame_areas(image, color_choice, chunk_mb * 1024 * 1024)
 
+        frame_pixels = image.shape[1] * image.shape[2]
+        ratios = [int((area / frame_pixels) * 100) for area in areas]
 
-        color_ratio = int((color_area / total_area) * 100)
+        total_area = sum(areas)
+        total_ratio = int((total_area / (frame_pixels * len(areas))) * 100)
+
+        return (total_area, total_ratio, areas, ratios, "", "")
+
+    def calculate_statistics(self, image, color_choice, chunk_mb):
+        stats = self.frame_statistics(image, color_choice, chunk_mb * 1024 * 1024)
+
+        areas = [frame["area"] for frame in stats]
+        frame_pixels = image.shape[1] * image.shape[2]
+        total_area = sum(areas)
+        total_ratio = int((total_area / (frame_pixels * len(areas))) * 100)
+
+        return (total_area, total_ratio, areas, [frame["ratio"] for frame in stats],
+                json.dumps(stats, ensure_ascii=False), "")
+
+    def calculate_palette(self, image, palette, tolerance, bins, chunk_mb):
+        classes = self.class_histogram(image, palette, tolerance, bins, chunk_mb * 1024 * 1024)
+
+        # 面积输出对应第一个类别，完整结果见类别统计
+        areas = [frame[0]["area"] for frame in classes]
+        frame_pixels = image.shape[1] * image.shape[2]
+        ratios = [int((area / frame_pixels) * 100) for area in areas]
+        total_area = sum(areas)
+        total_ratio = int((total_area / (frame_pixels * len(areas))) * 100)
+
+        return (total_area, total_ratio, areas, ratios, "", json.dumps(classes, ensure_ascii=False))
+
+    def combined_area(self, image, color_choice, budget_bytes):
+        # 原有语义：先对整个批次求平均，再逐通道计数；按行带流式扫描
+        _, height, width, channels = image.shape
+
+        color_area = 0
+        for _, rows in _blocks(1, height, width * channels, budget_bytes):
+            mask = _threshold(image[:, rows], 0, color_choice)
+            color_area += int(torch.count_nonzero(mask))
+
+        return color_area, height * width * channels
+
+    def frame_areas(self, image, color_choice, budget_bytes):
+        batch, height, width = image.shape[:3]
+
+        areas = torch.zeros(batch, dtype=torch.int64, device=image.device)
+        for frames, rows in _blocks(batch, height, width, budget_bytes):
+            mask = _threshold(image[frames, rows], -1, color_choice)
+            # 按维计数会先生成整个掩码的 int64 副本，逐帧做整体计数则不会
+            for i, frame_mask in enumerate(mask):
+                areas[frames.start + i] += torch.count_nonzero(frame_mask)
+            # 下一块阈值化之前释放，同一时刻只有一块的临时内存
+            del mask, frame_mask
+
+        return areas.tolist()
+
+    def frame_statistics(self, image, color_choice, budget_bytes):
+        from scipy import ndimage
+
+        batch, height, width = image.shape[:3]
+        frame_pixels = height * width
+
+        # 每帧的掩码只生成一次，按行带填入；面积、外框、质心和连通域都从它计算。
+        # 整块的掩码常驻，行带的阈值化和按行/列计数用预算的其余部分
+        block_bytes = max(_BYTES_PER_ELEMENT, _SUM_BYTES_PER_ELEMENT)
+        frames_per_chunk = max(1, budget_bytes // (frame_pixels * (block_bytes + 1)))
+        row_index = torch.arange(height, dtype=torch.float64, device=image.device)
+        col_index = torch.arange(width, dtype=torch.float64, device=image.device)
+        structure = ndimage.generate_binary_structure(2, 2)
+
+        stats = []
+        for start in range(0, batch, frames_per_chunk):
+            chunk = image[start:start + frames_per_chunk]
+            mask = torch.empty(chunk.shape[:3], dtype=torch.bool, device=image.device)
+            row_counts = torch.zeros(chunk.shape[:2], dtype=torch.int64, device=image.device)
+            col_counts = torch.zeros((chunk.shape[0], width), dtype=torch.int64, device=image.device)
+            for frames, rows in _blocks(chunk.shape[0], height, width, budget_bytes - mask.nbytes, block_bytes):
+                block = _threshold(chunk[frames, rows], -1, color_choice)
+                mask[frames, rows] = block
+                # 在行带上计数，int64 副本只有一个行带大小
+                row_counts[frames, rows] = block.sum(dim=2, dtype=torch.int64)
+                col_counts[frames] += block.sum(dim=1, dtype=torch.int64)
+                del block
+            areas = row_counts.sum(dim=1)
+
+            rows_any = row_counts > 0
+            cols_any = col_counts > 0
+            top = rows_any.int().argmax(dim=1)
+            bottom = height - rows_any.flip(1).int().argmax(dim=1)
+            left = cols_any.int().argmax(dim=1)
+            right = width - cols_any.flip(1).int().argmax(dim=1)
+
+            safe_areas = areas.clamp(min=1).double()
+            centroid_y = (row_counts.double() @ row_index) / safe_areas
+            centroid_x = (col_counts.double() @ col_index) / safe_areas
+
+            frame_masks = mask.cpu().numpy()
+            for i in range(mask.shape[0]):
+                area = int(areas[i])
+                frame = {"area": area, "ratio": int((area / frame_pixels) * 100)}
+                if area == 0:
+                    frame.update(bbox=None, centroid=None, components=0, largest_component=0)
+                    stats.append(frame)
+                    continue
+
+                labels, components = ndimage.label(frame_masks[i], structure=structure)
+                largest = int(torch.from_numpy(labels.ravel()).bincount()[1:].max())
+                del labels
+
+                frame.update(
+                    bbox=[int(left[i]), int(top[i]), int(right[i] - left[i]), int(bottom[i] - top[i])],
+                    centroid=[round(float(centroid_x[i]), 2), round(float(centroid_y[i]), 2)],
+                    components=int(components),
+                    largest_component=largest,
+                )
+                stats.append(frame)
+
+            # 下一块分配掩码之前释放本块的掩码
+            del mask, frame_masks
+
+        return stats
+
+    def class_histogram(self, image, palette, tolerance, bins, budget_bytes):
+        batch, height, width = image.shape[:3]
+        frame_pixels = height * width
+
+        colors = _parse_palette(palette)
+        if colors:
+            table = torch.tensor(
+                [[int(color[i:i + 2], 16) for i in (0, 2, 4)] for color in colors],
+                dtype=torch.float32, device=image.device,
+            ) / 255.0
+            # 最后一类收集超出容差的像素
+            num_classes = len(colors) + 1
+        else:
+            num_classes = bins
+
+        # 所有帧、所有类别的像素数在同一个 bincount 里累计，图像只扫描一遍
+        counts = torch.zeros(batch * num_classes, dtype=torch.int64, device=image.device)
+        element_bytes = num_classes * 4 + 16
+        for frames, rows in _blocks(batch, height, width, budget_bytes, element_bytes):
+            block = image[frames, rows]
+            if colors:
+                index = _palette_index(block, table, tolerance)
+            else:
+                index = _bin_index(block, bins)
+
+            offsets = torch.arange(frames.start, frames.start + block.shape[0], device=image.device)
+            index += (offsets * num_classes).view(-1, 1, 1)
+            counts += torch.bincount(index.flatten(), minlength=batch * num_classes)
+
+        if colors:
+            labels = [{"color": "#" + color} for color in colors] + [{"color": "other"}]
+        else:
+            labels = [{"bin": [round(i / bins, 4), round((i + 1) / bins, 4)]} for i in range(bins)]
 
-        return (int(color_area), color_ratio)
+        classes = []
+        for frame_counts in counts.view(batch, num_classes).tolist():
+            classes.append([
+                dict(label, area=count, ratio=round(count / frame_pixels * 100, 2))
+                for label, count in zip(labels, frame_counts)
+            ])
+        return classes
 
 NODE_CLASS_MAPPINGS = {
     "AreaCalculator": AreaCalculator
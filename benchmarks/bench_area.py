@@ -0,0 +1,65 @@
+# Snap Area 基准：对比原实现与分带/整数快速路径的耗时和峰值内存
+#
+#   python benchmarks/bench_area.py [--sizes 2048 8192 16384]
+
+import argparse
+
+import torch
+
+from common import load, measure, print_table
+
+
+def legacy_area(image, color_choice):
+    gray_image = torch.mean(image, dim=0)
+    if color_choice == "black":
+        mask = gray_image < 0.5
+    else:
+        mask = gray_image >= 0.5
+    color_area = torch.sum(mask).item()
+    return int(color_area), int((color_area / gray_image.numel()) * 100)
+
+
+def make_image(size, dtype):
+    generator = torch.Generator().manual_seed(size)
+    if dtype == "uint8":
+        return torch.randint(0, 256, (1, size, size, 3), dtype=torch.uint8, generator=generator)
+    if dtype == "bool":
+        return torch.rand((1, size, size), generator=generator) >= 0.5
+    return torch.rand((1, size, size, 3), generator=generator)
+
+
+def legacy_case(size, dtype):
+    image = make_image(size, dtype)
+    if dtype != "float32":
+        image = image.float() / 255.0 if dtype == "uint8" else image.float()
+    return lambda: legacy_area(image, "white")
+
+
+def tiled_case(size, dtype, chunk_mb):
+    node = load("area_calculator").AreaCalculator()
+    image = make_image(size, dtype)
+    return lambda: node.calculate_area(image, "white", False, chunk_mb)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 8192])
+    parser.add_argument("--chunk-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        for dtype in ("float32", "uint8", "bool"):
+            legacy = measure(legacy_case, size, dtype)
+            tiled = measure(tiled_case, size, dtype, args.chunk_mb)
+            rows.append([
+                f"{size}", dtype,
+                f"{legacy['seconds'] * 1000:.1f}", f"{legacy['peak_mb']:.0f}",
+                f"{tiled['seconds'] * 1000:.1f}", f"{tiled['peak_mb']:.0f}",
+            ])
+
+    print_table(["size", "input", "legacy ms", "legacy MB", "tiled ms", "tiled MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
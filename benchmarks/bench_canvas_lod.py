@@ -0,0 +1,71 @@
+# Snap Canvas 交互帧耗时基准：对比原图平滑绘制与代理金字塔绘制（离屏 Qt）
+#
+#   python benchmarks/bench_canvas_lod.py [--sizes 2048 6144]
+
+import argparse
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import torch
+
+from common import load, print_table
+
+
+def simulate(window, frames):
+    # 模拟交互：交替缩放视图和移动图像，每一步同步重绘视口
+    view = window.view
+    item = window.input_pixmap_item
+    view.frame_times.clear()
+    for step in range(frames):
+        view.begin_interaction()
+        factor = 1.05 if (step // 10) % 2 == 0 else 1 / 1.05
+        view.scale(factor, factor)
+        item.moveBy(1.0, 0.5)
+        view.viewport().repaint()
+    return view.frame_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 6144])
+    parser.add_argument("--frames", type=int, nargs="?", default=40)
+    args = parser.parse_args()
+
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+    bridge = load("ui.image_bridge")
+    canvas_window = load("ui.canvas_window")
+
+    rows = []
+    for size in args.sizes:
+        qimage = bridge.tensor_to_qimage(torch.rand((1, size, size, 3)))
+        for use_proxy in (False, True):
+            window = canvas_window.CanvasWindow(qimage)
+            window.resize(1024, 768)
+            window.show()
+            item = window.input_pixmap_item
+            item.use_proxy = use_proxy
+            # 让缩小后的图像居中落在画布内
+            item.setPos(window.canvas_width / 2 - size / 2, window.canvas_height / 2 - size / 2)
+            item.scale_pixmap(max(item.min_scale, 512 / size))
+            item.rotate_pixmap(30)
+            app.processEvents()
+
+            # 预热一帧，让代理金字塔在计时前生成
+            simulate(window, 1)
+            stats = simulate(window, args.frames)
+            rows.append([
+                f"{size}", "proxy" if use_proxy else "full",
+                f"{stats['mean_ms']:.1f}", f"{stats['p95_ms']:.1f}", f"{stats['max_ms']:.1f}",
+            ])
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+
+    print_table(["size", "paint", "mean ms", "p95 ms", "max ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Snap load 缩小解码基准：对比全尺寸解码与 max_side 缩小解码
+#
+#   python benchmarks/bench_draft.py [--max-side 1024]
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from common import load, measure, print_table
+
+
+def make_file(directory, width, height, format):
+    rng = np.random.default_rng(width)
+    ramp = np.linspace(0, 255, width, dtype=np.float32)
+    pixels = (ramp[None, :, None] + rng.normal(0, 12, (height, width, 3))).clip(0, 255)
+    path = Path(directory) / f"{width}x{height}.{format.lower()}"
+    Image.fromarray(pixels.astype(np.uint8)).save(path, format=format)
+    return str(path)
+
+
+def decode_case(path, max_side):
+    snapload = load("Snapload").Snapload
+    return lambda: snapload._decode_image(path, max_side)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, nargs=2, default=[6000, 4000])
+    parser.add_argument("--max-side", type=int, default=1024)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for format in ("JPEG", "PNG"):
+            path = make_file(directory, *args.size, format)
+            for max_side in (0, args.max_side):
+                result = measure(decode_case, path, max_side)
+                rows.append([
+                    format, max_side or "full",
+                    f"{result['seconds'] * 1000:.1f}",
+                    f"{result['peak_mb']:.0f}",
+                ])
+
+    print_table(["format", "max_side", "ms", "peak MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
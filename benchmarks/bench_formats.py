@@ -0,0 +1,67 @@
+# 画布输出格式基准：各格式的编码耗时、Snapload 读取耗时与文件大小
+#
+#   python benchmarks/bench_formats.py [--sizes 1024 2048 4096]
+
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from common import load, measure, print_table
+
+FORMATS = [
+    ("png", 1), ("png", 6), ("png", 9),
+    ("tiff", None), ("bmp", None), ("webp", None), ("npy", None),
+]
+
+
+def make_canvas(size):
+    # 白底上的渐变图像加轻微噪声，接近画布合成结果的可压缩性
+    rng = np.random.default_rng(size)
+    canvas = np.full((size, size, 3), 255, dtype=np.uint8)
+    inner = size * 3 // 4
+    ramp = np.linspace(0, 255, inner, dtype=np.float32)
+    pixels = ramp[None, :, None] + rng.normal(0, 6, (inner, inner, 3))
+    canvas[size // 8:size // 8 + inner, size // 8:size // 8 + inner] = pixels.clip(0, 255)
+    return canvas
+
+
+def encode_case(size, path, output_format, compress_level):
+    writer = load("output_writer")
+    canvas = make_canvas(size)
+    return lambda: writer.write_image(canvas, path, output_format, compress_level or 6)
+
+
+def decode_case(path):
+    snapload = load("Snapload").Snapload
+    return lambda: snapload._decode_image(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096])
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for output_format, compress_level in FORMATS:
+                name = output_format if compress_level is None else f"{output_format}-{compress_level}"
+                path = str(Path(directory) / f"{size}-{name}.{output_format}")
+
+                encoded = measure(encode_case, size, path, output_format, compress_level)
+                decoded = measure(decode_case, path)
+                rows.append([
+                    f"{size}²", name,
+                    f"{encoded['seconds'] * 1000:.1f}",
+                    f"{decoded['seconds'] * 1000:.1f}",
+                    f"{os.path.getsize(path) / 1024 ** 2:.2f}",
+                ])
+
+    print_table(["canvas", "format", "encode ms", "decode ms", "MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# 导入耗时回归检查：用 python -X importtime 加载节点包，确认不会导入 PyQt5
+#
+#   python benchmarks/bench_import.py [--max-ms 500]
+#
+# 导入了 PyQt5，或节点包自身（不含 torch 等依赖）耗时超过 --max-ms 时返回非零退出码
+
+import argparse
+import subprocess
+import sys
+
+from common import ROOT
+
+# torch / numpy / PIL 在 ComfyUI 启动时已经导入，先行导入以免计入节点包耗时
+CHILD = """
+import sys
+sys.path.insert(0, {bench!r})
+import torch, numpy, PIL.Image
+import common
+common.load_package()
+print("PyQt5" in sys.modules)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(bench=str(ROOT / "benchmarks"))],
+        capture_output=True, text=True, check=True,
+    )
+    qt_loaded = result.stdout.strip().splitlines()[-1] == "True"
+
+    package_us = 0
+    qt_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        if name == ROOT.name:
+            package_us = int(cumulative)
+        elif name.split(".")[0] == "PyQt5":
+            qt_us += int(self_us)
+
+    print(f"package import: {package_us / 1000:.1f} ms")
+    print(f"PyQt5 loaded:   {qt_loaded} ({qt_us / 1000:.1f} ms)")
+
+    if qt_loaded or package_us / 1000 > args.max_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
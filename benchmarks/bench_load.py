@@ -0,0 +1,72 @@
+# Snap load 基准：对比原解码路径与预分配原地缩放路径的耗时、峰值内存和分配量
+#
+#   python benchmarks/bench_load.py [--sizes 1024 4096]
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps
+
+from common import load, measure, print_table
+
+
+def legacy_decode(image_path):
+    i = Image.open(image_path)
+    i = ImageOps.exif_transpose(i)
+    image = i.convert("RGB")
+    image = np.array(image).astype(np.float32) / 255.0
+    image = torch.from_numpy(image)[None,]
+    if 'A' in i.getbands():
+        mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
+        mask = 1. - torch.from_numpy(mask)
+    else:
+        mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
+    return (image, mask)
+
+
+def make_file(directory, size, mode):
+    # 渐变加噪声，压缩比接近真实照片
+    rng = np.random.default_rng(size)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    pixels = (ramp[None, :, None] + rng.normal(0, 12, (size, size, len(mode)))).clip(0, 255)
+    path = Path(directory) / f"{mode}_{size}.png"
+    Image.fromarray(pixels.astype(np.uint8), mode).save(path, compress_level=1)
+    return str(path)
+
+
+def legacy_case(path):
+    return lambda: legacy_decode(path)
+
+
+def current_case(path):
+    snapload = load("Snapload").Snapload
+    return lambda: snapload._decode_image(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 4096])
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for mode in ("RGB", "RGBA"):
+                path = make_file(directory, size, mode)
+                for name, case in (("legacy", legacy_case), ("in-place", current_case)):
+                    result = measure(case, path)
+                    rows.append([
+                        f"{size}", mode, name,
+                        f"{result['seconds'] * 1000:.1f}",
+                        f"{result['peak_mb']:.0f}",
+                        f"{result['alloc_mb']:.0f}",
+                    ])
+
+    print_table(["size", "mode", "path", "ms", "peak MB", "alloc MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
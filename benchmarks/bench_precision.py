@@ -0,0 +1,82 @@
+# 输出精度基准：4k 批次按 float32 / float16 / uint8 加载时的耗时、峰值 RSS 与缓存占用，
+# 以及 Snap Area 直接对各精度阈值化的耗时
+#
+#   python benchmarks/bench_precision.py [--size 4096] [--batches 1 4 8]
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from common import load, measure, print_table
+
+PRECISIONS = ["float32", "float16", "uint8"]
+
+
+def write_frames(directory, size, batch):
+    # 带 alpha 的渐变加噪声帧，MASK 也按完整尺寸解码
+    rng = np.random.default_rng(size)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    rgba = np.empty((size, size, 4), dtype=np.uint8)
+    rgba[..., :3] = (ramp[None, :, None] + rng.normal(0, 6, (size, size, 3))).clip(0, 255)
+    rgba[..., 3] = ramp[:, None]
+    for i in range(batch):
+        path = Path(directory) / f"{i:03d}.png"
+        if not path.exists():
+            Image.fromarray(rgba).save(path, compress_level=1)
+
+
+def load_case(directory, precision):
+    module = load("Snapload")
+
+    def run():
+        module.DECODED_CACHE.clear()
+        return module.Snapload().load_image(directory, precision=precision)
+    return run
+
+
+def area_case(directory, precision, per_image):
+    images, _ = load("Snapload").Snapload().load_image(directory, precision=precision)
+    calculator = load("area_calculator").AreaCalculator()
+    return lambda: calculator.calculate_area(images, "white", per_image=per_image)
+
+
+def cached_mb(size, batch, precision):
+    # 缓存中的 IMAGE + MASK：每像素 4 个分量
+    itemsize = {"float32": 4, "float16": 2, "uint8": 1}[precision]
+    return batch * size * size * 4 * itemsize / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        for batch in args.batches:
+            directory = str(Path(root) / str(batch))
+            Path(directory).mkdir()
+            write_frames(directory, args.size, batch)
+
+            for precision in PRECISIONS:
+                loaded = measure(load_case, directory, precision, repeat=1)
+                combined = measure(area_case, directory, precision, False)
+                per_image = measure(area_case, directory, precision, True)
+                rows.append([
+                    f"{args.size}²x{batch}", precision,
+                    f"{cached_mb(args.size, batch, precision):.0f}",
+                    f"{loaded['peak_mb']:.0f}",
+                    f"{loaded['seconds'] * 1000:.0f}",
+                    f"{combined['seconds'] * 1000:.0f}",
+                    f"{per_image['seconds'] * 1000:.0f}",
+                ])
+
+    print_table(["batch", "precision", "cache MB", "load peak MB", "load ms", "area ms", "per-image ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
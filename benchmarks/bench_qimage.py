@@ -0,0 +1,79 @@
+# Snap Canvas 图像转换基准：对比 PNG 往返与直接缓冲区转换（离屏 Qt）
+#
+#   python benchmarks/bench_qimage.py [--sizes 512 2048 8192]
+
+import argparse
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+from common import load, measure, print_table
+
+
+def legacy_tensor_to_qimage(tensor):
+    from PyQt5.QtGui import QImage
+
+    tensor = tensor.squeeze(0).permute(2, 0, 1)
+    image_data = tensor.mul(255).byte().cpu().numpy().transpose(1, 2, 0)
+    buffer = BytesIO()
+    Image.fromarray(image_data, 'RGB').save(buffer, format="PNG")
+    return QImage.fromData(buffer.getvalue(), "PNG")
+
+
+def legacy_qimage_to_tensor(qimage):
+    from PyQt5.QtGui import QImage
+
+    qimage = qimage.convertToFormat(QImage.Format_RGB888)
+    ptr = qimage.bits()
+    ptr.setsize(qimage.byteCount())
+    image_np = np.array(ptr).reshape((qimage.height(), qimage.width(), 3))
+    return torch.from_numpy(image_np).permute(2, 0, 1).float() / 255.0
+
+
+def make_tensor(size):
+    return torch.rand((1, size, size, 3), generator=torch.Generator().manual_seed(size))
+
+
+def to_qimage_case(size, legacy):
+    tensor = make_tensor(size)
+    if legacy:
+        return lambda: legacy_tensor_to_qimage(tensor)
+    bridge = load("ui.image_bridge")
+    return lambda: bridge.tensor_to_qimage(tensor)
+
+
+def from_qimage_case(size, legacy):
+    bridge = load("ui.image_bridge")
+    qimage = bridge.tensor_to_qimage(make_tensor(size)).copy()
+    if legacy:
+        return lambda: legacy_qimage_to_tensor(qimage)
+    return lambda: bridge.qimage_to_tensor(qimage)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 2048, 4096, 8192])
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        for stage, case in (("tensor->qimage", to_qimage_case), ("qimage->tensor", from_qimage_case)):
+            legacy = measure(case, size, True, repeat=1)
+            bridge = measure(case, size, False, repeat=1)
+            rows.append([
+                f"{size}", stage,
+                f"{legacy['seconds'] * 1000:.1f}", f"{legacy['peak_mb']:.0f}",
+                f"{bridge['seconds'] * 1000:.1f}", f"{bridge['peak_mb']:.0f}",
+            ])
+
+    print_table(["size", "stage", "legacy ms", "legacy MB", "bridge ms", "bridge MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# 基准测试公共工具：按需加载节点模块，并在独立子进程中测量耗时与峰值内存
+
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "snap_processing"
+
+
+def _stub_folder_paths():
+    # 脱离 ComfyUI 运行时提供最小的 folder_paths，路径原样解析
+    try:
+        import folder_paths  # noqa: F401
+    except ImportError:
+        stub = types.ModuleType("folder_paths")
+        stub.get_annotated_filepath = lambda name: os.path.abspath(name)
+        sys.modules["folder_paths"] = stub
+
+
+def load(module):
+    # 只导入需要的子模块，不执行包的 __init__.py
+    _stub_folder_paths()
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(ROOT)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{module}")
+
+
+def load_package():
+    # 与 ComfyUI 相同的方式加载整个节点包（执行 __init__.py）
+    _stub_folder_paths()
+    sys.path.insert(0, str(ROOT.parent))
+    # 使用 __import__ 而不是 importlib，-X importtime 才会记录这次导入
+    __import__(ROOT.name)
+    return sys.modules[ROOT.name]
+
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+
+def _reset_peak():
+    # Linux 下写入 5 可重置 VmHWM，使峰值只统计被测阶段
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _measure(case, args, repeat):
+    run = case(*args)
+
+    # 峰值内存取首次调用，避免分配器复用预热时留下的内存
+    reset = _reset_peak()
+    baseline = _status_kb("VmRSS") or 0
+    run()
+    if reset:
+        peak = _status_kb("VmHWM") or 0
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    # tracemalloc 统计 Python/NumPy 分配（不含 torch 内部分配器）
+    tracemalloc.start()
+    run()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": best,
+        "peak_mb": max(0, peak - baseline) / 1024,
+        "alloc_mb": traced_peak / 1024 ** 2,
+    }
+
+
+def measure(case, *args, repeat=3):
+    # case(*args) 负责准备输入并返回无参的被测函数；每次测量使用全新进程
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(_measure, (case, args, repeat))
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(x)) for x in column) for column in zip(headers, *rows)]
+    for row in [headers] + rows:
+        print("  ".join(str(x).rjust(w) for x, w in zip(row, widths)))
@@ -0,0 +1,262 @@
+# 完整基准套件：三个节点的各个阶段在 512² ~ 8k、批次 1 ~ 256 的合成图像上测量
+# 耗时、峰值 RSS 与分配量，结果写成 JSON；compare 对比基线并标出回退。
+# 画布部分在离屏 Qt 下运行，folder_paths 由 common 提供最小实现，无需 ComfyUI。
+#
+#   python benchmarks/run.py run [--quick] [--output report.json] [--only area.]
+#   python benchmarks/run.py run --output benchmarks/baseline.json      # 保存基线
+#   python benchmarks/run.py compare benchmarks/baseline.json report.json [--time 0.1 --memory 0.1]
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import torch
+from PIL import Image
+
+from common import ROOT, load, measure, print_table
+
+SIZES = [512, 1024, 2048, 4096, 8192]
+BATCHES = [1, 4, 16, 64, 256]
+QUICK_SIZES = [512, 2048]
+QUICK_BATCHES = [1, 16]
+
+
+def make_batch(size, batch):
+    # 平滑的正弦斑块，每帧相位不同；阈值化后连通域数量接近真实图像
+    coords = torch.linspace(0, 2 * math.pi, size)
+    phase = torch.arange(batch, dtype=torch.float32)[:, None, None] * 0.7
+    waves = torch.sin(coords[None, None, :] * 3 + phase) * torch.cos(coords[None, :, None] * 2 - phase)
+    channels = [waves, waves.roll(size // 7, dims=1), waves.roll(size // 5, dims=2)]
+    return torch.stack(channels, dim=-1).mul_(0.5).add_(0.5)
+
+
+# ---- Snap Area ----
+
+def area_case(size, batch, mode):
+    calculator = load("area_calculator").AreaCalculator()
+    image = make_batch(size, batch)
+    options = {"combined": {}, "per_image": {"per_image": True}, "statistics": {"statistics": True}}[mode]
+    return lambda: calculator.calculate_area(image, "white", **options)
+
+
+# ---- Snapload ----
+
+def decode_case(path):
+    module = load("Snapload")
+
+    def run():
+        module.DECODED_CACHE.clear()
+        return module.Snapload().load_image(path)
+    return run
+
+
+def batch_case(path, batch):
+    module = load("Snapload")
+    # 同一文件重复 batch 行，即按多行路径批量加载
+    listing = "\n".join([path] * batch)
+
+    def run():
+        module.DECODED_CACHE.clear()
+        return module.Snapload().load_image(listing)
+    return run
+
+
+def is_changed_case(path, cold):
+    module = load("Snapload")
+
+    def run():
+        if cold:
+            module._FINGERPRINTS.clear()
+        return module.Snapload.IS_CHANGED(path)
+    return run
+
+
+# ---- Snap Canvas ----
+
+def tensor_to_qimage_case(size):
+    node = load("Snap_canvas").PyQtCanvasNode()
+    tensor = make_batch(size, 1)
+    return lambda: node.tensor_to_qimage(tensor[0])
+
+
+def qimage_to_tensor_case(size):
+    node = load("Snap_canvas").PyQtCanvasNode()
+    qimage = node.tensor_to_qimage(make_batch(size, 1)[0]).copy()
+    return lambda: node.qimage_to_tensor(qimage)
+
+
+def qimage_to_rgba_case(size):
+    from PyQt5.QtGui import QImage
+
+    node = load("Snap_canvas").PyQtCanvasNode()
+    qimage = node.tensor_to_qimage(make_batch(size, 1)[0]).convertToFormat(QImage.Format_RGBA8888_Premultiplied)
+    return lambda: node.qimage_to_rgba(qimage)
+
+
+def numpy_to_png_case(size, path):
+    node = load("Snap_canvas").PyQtCanvasNode()
+    array = make_batch(size, 1)[0].mul(255).to(torch.uint8).numpy()
+    return lambda: node.numpy_to_png(array, path)
+
+
+def render_layout_case(size, batch):
+    canvas_layout = load("canvas_layout")
+    images = make_batch(size, batch)
+    layout = {"canvas_width": size, "canvas_height": size, "x": size * 0.1, "y": size * 0.2,
+              "scale": 0.75, "rotation": 15.0}
+    return lambda: canvas_layout.render_layout(images, layout)
+
+
+def write_png(directory, size):
+    path = Path(directory) / f"{size}.png"
+    if not path.exists():
+        array = make_batch(size, 1)[0].mul(255).to(torch.uint8).numpy()
+        Image.fromarray(array).save(path)
+    return str(path)
+
+
+def stages(sizes, batches, directory, max_mb):
+    # (名称, 参数, 用例函数, 用例参数)；按 float32 批次大小跳过超出 max_mb 的组合
+    def fits(size, batch):
+        return size * size * 3 * 4 * batch <= max_mb * 1024 ** 2
+
+    for size in sizes:
+        for batch in batches:
+            if not fits(size, batch):
+                continue
+            for mode in ("combined", "per_image", "statistics"):
+                yield f"area.{mode}", size, batch, area_case, (size, batch, mode)
+            yield "canvas.render_layout", size, batch, render_layout_case, (size, batch)
+            if batch > 1:
+                yield "snapload.batch", size, batch, batch_case, (write_png(directory, size), batch)
+
+        if not fits(size, 1):
+            continue
+        path = write_png(directory, size)
+        yield "snapload.load_image", size, 1, decode_case, (path,)
+        yield "snapload.is_changed_cold", size, 1, is_changed_case, (path, True)
+        yield "snapload.is_changed_warm", size, 1, is_changed_case, (path, False)
+        yield "canvas.tensor_to_qimage", size, 1, tensor_to_qimage_case, (size,)
+        yield "canvas.qimage_to_tensor", size, 1, qimage_to_tensor_case, (size,)
+        yield "canvas.qimage_to_rgba", size, 1, qimage_to_rgba_case, (size,)
+        yield "canvas.numpy_to_png", size, 1, numpy_to_png_case, (size, str(Path(directory) / f"out-{size}.png"))
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args):
+    sizes = QUICK_SIZES if args.quick else args.sizes
+    batches = QUICK_BATCHES if args.quick else args.batches
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for stage, size, batch, case, case_args in stages(sizes, batches, directory, args.max_mb):
+            if args.only and not any(stage.startswith(prefix) for prefix in args.only):
+                continue
+            name = f"{stage}[{size}x{batch}]"
+            print(f"{name} ...", file=sys.stderr, flush=True)
+            result = measure(case, *case_args, repeat=args.repeat)
+            results[name] = dict(stage=stage, size=size, batch=batch, **result)
+
+    report = {"environment": environment(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print_table(["case", "ms", "peak MB", "alloc MB"], [
+        [name, f"{r['seconds'] * 1000:.1f}", f"{r['peak_mb']:.0f}", f"{r['alloc_mb']:.1f}"]
+        for name, r in results.items()
+    ])
+    print(f"report: {args.output}")
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    rows = []
+    regressions = 0
+    for name in sorted(set(baseline) | set(current)):
+        if name not in current:
+            rows.append([name, "-", "-", "-", "-", "missing"])
+            continue
+        if name not in baseline:
+            rows.append([name, "-", f"{current[name]['seconds'] * 1000:.1f}", "-", "-", "new"])
+            continue
+
+        old, new = baseline[name], current[name]
+        time_ratio = new["seconds"] / old["seconds"] if old["seconds"] > 0 else 1.0
+        memory_delta = new["peak_mb"] - old["peak_mb"]
+
+        # 很短的用例和很小的内存变化容易受噪声影响，只在超过绝对下限时判定
+        slower = time_ratio > 1 + args.time and (new["seconds"] - old["seconds"]) * 1000 > args.min_ms
+        larger = memory_delta > max(args.min_mb, old["peak_mb"] * args.memory)
+        status = "REGRESSION" if slower or larger else ("faster" if time_ratio < 1 - args.time else "ok")
+        regressions += status == "REGRESSION"
+
+        rows.append([
+            name, f"{old['seconds'] * 1000:.1f}", f"{new['seconds'] * 1000:.1f}",
+            f"{time_ratio:.2f}x", f"{memory_delta:+.0f}", status,
+        ])
+
+    print_table(["case", "base ms", "ms", "time", "peak MB Δ", "status"], rows)
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    run_parser.add_argument("--batches", type=int, nargs="+", default=BATCHES)
+    run_parser.add_argument("--quick", action="store_true", help="512²/2048², batch 1/16")
+    run_parser.add_argument("--only", nargs="+", help="stage prefixes, e.g. area. snapload.")
+    run_parser.add_argument("--max-mb", type=int, default=4096, help="skip inputs larger than this")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", default="benchmark_report.json")
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--time", type=float, default=0.10, help="allowed relative slowdown")
+    compare_parser.add_argument("--memory", type=float, default=0.10, help="allowed relative peak RSS growth")
+    compare_parser.add_argument("--min-ms", type=float, default=2.0)
+    compare_parser.add_argument("--min-mb", type=float, default=8.0)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
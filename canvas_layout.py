@@ -0,0 +1,135 @@
+# Snap Canvas 布局的保存与无界面重放，本模块不依赖 Qt
+
+import json
+import math
+import os
+import threading
+
+import torch
+import torch.nn.functional as F
+
+LAYOUT_FILE = os.path.join(os.getcwd(), "canvas", "layouts.json")
+
+# render_layout 按水平条带渲染，单个条带临时张量的上限
+_BAND_BYTES = 64 * 1024 * 1024
+
+_lock = threading.Lock()
+
+
+def layout_key(preset, seed):
+    # 优先使用预设名，否则按种子区分
+    preset = (preset or "").strip()
+    return preset if preset else f"seed:{seed}"
+
+
+def load_layouts(path=LAYOUT_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def get_layout(key, path=LAYOUT_FILE):
+    with _lock:
+        return load_layouts(path).get(key)
+
+
+def save_layout(key, layout, path=LAYOUT_FILE):
+    with _lock:
+        layouts = load_layouts(path)
+        layouts[key] = layout
+
+        # 先写临时文件再替换，避免并发读到半个 JSON
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(layouts, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+
+def scale_layout(layout, factor):
+    # 画布和图像同时放大 factor 倍，用于高分辨率导出
+    if factor == 1:
+        return layout
+    return dict(
+        layout,
+        canvas_width=int(round(layout["canvas_width"] * factor)),
+        canvas_height=int(round(layout["canvas_height"] * factor)),
+        x=layout["x"] * factor,
+        y=layout["y"] * factor,
+        scale=layout["scale"] * factor,
+    )
+
+
+def layout_theta(layout, source_width, source_height, canvas_width, canvas_height):
+    # 与 ResizablePixmapItem.update_transform 相同的变换：绕图像中心先缩放后旋转，
+    # 场景坐标 q = pos + c + R·S·(p - c)。这里求其逆，并换算到 affine_grid 的归一化坐标
+    scale = layout["scale"]
+    angle = math.radians(layout["rotation"])
+    cos, sin = math.cos(angle), math.sin(angle)
+
+    cx, cy = source_width / 2, source_height / 2
+
+    # 由保存的左上角 (mapToScene(0, 0)) 反推 item 的 pos
+    pos_x = layout["x"] - cx + scale * (cos * cx - sin * cy)
+    pos_y = layout["y"] - cy + scale * (sin * cx + cos * cy)
+
+    # (R·S)⁻¹
+    inverse = [[cos / scale, sin / scale], [-sin / scale, cos / scale]]
+
+    # 输出像素中心 q = (x_n + 1) · size / 2，源像素 p → u_n = 2p / size - 1
+    half_w, half_h = canvas_width / 2, canvas_height / 2
+    ox, oy = half_w - pos_x - cx, half_h - pos_y - cy
+    px = inverse[0][0] * ox + inverse[0][1] * oy + cx
+    py = inverse[1][0] * ox + inverse[1][1] * oy + cy
+
+    return torch.tensor([
+        [2 / source_width * inverse[0][0] * half_w, 2 / source_width * inverse[0][1] * half_h, 2 * px / source_width - 1],
+        [2 / source_height * inverse[1][0] * half_w, 2 / source_height * inverse[1][1] * half_h, 2 * py / source_height - 1],
+    ], dtype=torch.float32)
+
+
+def render_layout(images, layout, band_bytes=_BAND_BYTES, dtype=torch.float32):
+    # images: (B, H, W, C) → 白底画布 (B, canvas_h, canvas_w, 3) 以及图像覆盖率 (canvas_h, canvas_w)
+    # 输出按 dtype 逐条带写入，紧凑精度时整个批次不会以 float32 出现；uint8 输入按 255 为 1.0
+    batch, height, width = images.shape[:3]
+    canvas_width, canvas_height = layout["canvas_width"], layout["canvas_height"]
+    device = images.device
+
+    theta = layout_theta(layout, width, height, canvas_width, canvas_height).to(device)
+    source = images[..., :3].permute(0, 3, 1, 2).float()
+    if not images.is_floating_point():
+        source = source.div_(255)
+    ones = torch.ones((1, 1, height, width), dtype=torch.float32, device=device)
+
+    output = torch.empty((batch, canvas_height, canvas_width, 3), dtype=dtype, device=device)
+    coverage = torch.empty((canvas_height, canvas_width), dtype=torch.float32, device=device)
+
+    # 每行的临时量：采样网格 2 + 覆盖率 1 + 各帧 3 个通道
+    rows = max(1, band_bytes // (canvas_width * 4 * (3 + 3 * batch)))
+    for top in range(0, canvas_height, rows):
+        band = min(rows, canvas_height - top)
+
+        # 条带内的归一化 y 映射回整幅画布的归一化 y
+        to_canvas = torch.tensor([
+            [1.0, 0.0, 0.0],
+            [0.0, band / canvas_height, (2 * top + band) / canvas_height - 1],
+            [0.0, 0.0, 1.0],
+        ], dtype=torch.float32, device=device)
+        band_theta = theta @ to_canvas
+        grid = F.affine_grid(band_theta[None], (1, 1, band, canvas_width), align_corners=False)
+
+        warped = F.grid_sample(source, grid.expand(batch, -1, -1, -1), mode="bilinear",
+                               padding_mode="zeros", align_corners=False)
+        band_coverage = F.grid_sample(ones, grid, mode="bilinear", padding_mode="zeros",
+                                      align_corners=False)[0, 0]
+
+        # 零填充采样得到的是预乘颜色，补上白色背景即为合成结果
+        warped += (1.0 - band_coverage)
+        if dtype == torch.uint8:
+            warped = warped.mul_(255).round_()
+        output[:, top:top + band] = warped.permute(0, 2, 3, 1)
+        coverage[top:top + band] = band_coverage
+
+    return output, coverage
@@ -0,0 +1,143 @@
+# 常驻的 Snap Canvas 窗口进程：服务进程不加载 Qt，图像和结果都经共享内存传递，
+# 每次打开画布只需一次消息往返。本模块不依赖 Qt
+
+import atexit
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client
+
+import numpy as np
+
+from . import instrumentation
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui", "canvas_worker.py")
+
+# 连接口令通过环境变量传给子进程，不出现在命令行里
+AUTHKEY_ENV = "SNAP_CANVAS_AUTHKEY"
+
+
+def attach_array(name, shape):
+    # 读取对方创建的共享内存：拷贝出来后立即解除链接。Windows 上 unlink 不做任何事，
+    # 共享内存在窗口进程收到 release 并关闭句柄后释放
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class CanvasWorker:
+    def __init__(self):
+        self.process = None
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        authkey = secrets.token_bytes(32)
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT], stdout=subprocess.PIPE, env=env,
+        )
+
+        # 子进程在标准输出的第一行报告监听地址
+        line = self.process.stdout.readline().decode().strip()
+        if not line:
+            self.process.wait()
+            raise RuntimeError(f"Snap Canvas 窗口进程启动失败，退出码 {self.process.returncode}")
+        host, port = line.rsplit(":", 1)
+        self.connection = Client((host, int(port)), authkey=authkey)
+
+    def close(self):
+        with self._lock:
+            if self.connection is not None:
+                try:
+                    self.connection.send({"command": "quit"})
+                except OSError:
+                    pass
+                self.connection.close()
+                self.connection = None
+            if self.process is not None:
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                self.process = None
+
+    def open_canvas(self, image, export_scale=1):
+        # image: HxWx3 uint8。返回值与 PyQtCanvasNode.run_pyqt_gui 相同，只是图像为 uint8 数组
+        return self._call("open", image, export_scale)[0]
+
+    def open_session(self, images, export_scale=1):
+        # images: BxHxWx3 uint8，各帧作为会话窗口中的一项；返回每项的 open_canvas 结果
+        return self._call("session", images, export_scale)
+
+    def _call(self, command, image, export_scale):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+
+        with self._lock:
+            if not self.alive():
+                with instrumentation.span("canvas.worker_start"):
+                    self.start()
+
+            shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+            try:
+                with instrumentation.span("canvas.shm_copy", image.nbytes):
+                    np.ndarray(image.shape, dtype=np.uint8, buffer=shm.buf)[...] = image
+                try:
+                    start = time.perf_counter()
+                    self.connection.send({
+                        "command": command,
+                        "name": shm.name,
+                        "shape": image.shape,
+                        "export_scale": export_scale,
+                    })
+                    reply = self.connection.recv()
+                    elapsed = time.perf_counter() - start
+                except (EOFError, OSError):
+                    # 窗口进程意外退出，下次调用时重新启动
+                    self.connection.close()
+                    self.connection = None
+                    self.process.kill()
+                    raise RuntimeError("Snap Canvas 窗口进程已退出")
+            finally:
+                shm.close()
+                shm.unlink()
+
+            if "error" in reply:
+                raise RuntimeError(reply["error"])
+
+            # 结果在持锁期间拷贝，拷贝完成后才让窗口进程关闭这些结果的句柄，
+            # 其他线程的请求不会插在两者之间
+            results = []
+            try:
+                with instrumentation.span("canvas.shm_copy") as copied:
+                    for item in reply["items"]:
+                        modified_image = attach_array(*item["image"])
+                        export_image = attach_array(*item["export"]) if item["export"] is not None else None
+                        copied.nbytes += modified_image.nbytes + (export_image.nbytes if export_image is not None else 0)
+                        results.append(
+                            (modified_image, item["x"], item["y"], item["scale"], item["layout"], export_image))
+            finally:
+                try:
+                    self.connection.send({"command": "release"})
+                except OSError:
+                    pass
+
+        # 往返时间中扣除窗口进程内的渲染耗时，其余都算作等待用户
+        render_seconds = sum(item["render_seconds"] for item in reply["items"])
+        instrumentation.record("canvas.gui_wait", elapsed - render_seconds, wait=True)
+        instrumentation.record("canvas.render", render_seconds, sum(item["render_bytes"] for item in reply["items"]))
+        return results
+
+
+WORKER = CanvasWorker()
+atexit.register(WORKER.close)
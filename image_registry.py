@@ -0,0 +1,92 @@
+# 进程内的图像交接：Snap Canvas 以输出路径为令牌发布已生成的张量，
+# Snapload 拿到同一令牌时直接返回该张量，不再经过文件读写和解码
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class ImageRegistry:
+    # 每次发布计一个引用，被取用一次减一个；超出字节上限时先淘汰无人等待的最久未用条目，
+    # 仍然超出时才淘汰尚未取用的条目，取用方此时回退到读文件
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, token, tensors):
+        # 按底层存储计算占用，视图会让整块存储保持存活
+        nbytes = sum(t.untyped_storage().nbytes() for t in tensors)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            self._generation += 1
+            refs = 1
+            if token in self._entries:
+                previous = self._entries.pop(token)
+                self.current_bytes -= previous["nbytes"]
+                refs += previous["refs"]
+
+            self._entries[token] = {
+                "tensors": tensors,
+                "nbytes": nbytes,
+                "refs": refs,
+                "generation": self._generation,
+            }
+            self.current_bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes:
+            victim = next((t for t, e in self._entries.items() if e["refs"] == 0), None)
+            if victim is None:
+                victim = next(iter(self._entries))
+            self.current_bytes -= self._entries.pop(victim)["nbytes"]
+
+    def generation(self, token):
+        # 条目版本号，供 IS_CHANGED 区分同一路径上先后发布的不同结果
+        with self._lock:
+            entry = self._entries.get(token)
+            return None if entry is None else entry["generation"]
+
+    def fetch(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            entry["refs"] = max(0, entry["refs"] - 1)
+            self.hits += 1
+            return entry["tensors"]
+
+    def discard(self, token):
+        with self._lock:
+            entry = self._entries.pop(token, None)
+            if entry is not None:
+                self.current_bytes -= entry["nbytes"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pending": sum(1 for e in self._entries.values() if e["refs"] > 0),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 上限可通过环境变量 SNAP_REGISTRY_BYTES 配置，设为 0 即关闭
+REGISTRY = ImageRegistry(int(os.environ.get("SNAP_REGISTRY_BYTES", 1024 ** 3)))
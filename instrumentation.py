@@ -0,0 +1,197 @@
+# 节点内各阶段的计时与内存记录：span 记录耗时和字节数，汇总到进程内的滚动统计（p50/p95），
+# 可随时 dump。等待用户操作的 span 单独统计，不计入计算耗时。
+#
+# 环境变量：
+#   SNAP_TRACE=1                      每个 span 和每次执行都以 INFO 级别写日志（默认 DEBUG）
+#   SNAP_PROFILE=cprofile|tracemalloc 对下一次节点执行做一次完整采集，结果写到 SNAP_PROFILE_DIR
+
+import cProfile
+import json
+import logging
+import math
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("snap_processing")
+
+TRACE = os.environ.get("SNAP_TRACE", "") not in ("", "0")
+PROFILE_DIR = os.environ.get("SNAP_PROFILE_DIR", os.path.join(os.getcwd(), "canvas", "profiles"))
+
+# 每个 span 保留最近多少次记录用于计算分位数
+WINDOW = 512
+
+_local = threading.local()
+_capture_lock = threading.Lock()
+_capture = os.environ.get("SNAP_PROFILE", "").lower() or None
+
+
+class SpanStats:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, nbytes=0):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            self._samples[name].append((seconds, nbytes))
+            self._counts[name] += 1
+
+    def summary(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+
+        result = {}
+        for name, values in sorted(samples.items()):
+            durations = sorted(seconds for seconds, _ in values)
+            result[name] = {
+                "count": counts[name],
+                "p50_ms": _percentile(durations, 0.50) * 1000,
+                "p95_ms": _percentile(durations, 0.95) * 1000,
+                "max_ms": durations[-1] * 1000,
+                "mean_mb": sum(nbytes for _, nbytes in values) / len(values) / 1024 ** 2,
+            }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+def _percentile(sorted_values, fraction):
+    # 最近秩法
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+STATS = SpanStats()
+
+
+class Span:
+    def __init__(self, name, nbytes=0, wait=False):
+        self.name = name
+        self.nbytes = nbytes
+        self.wait = wait
+        self.seconds = 0.0
+
+
+@contextmanager
+def span(name, nbytes=0, wait=False):
+    # 字节数在开始时未知的，可在 with 块内设置 span.nbytes
+    current = Span(name, nbytes, wait)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _finish(current)
+
+
+def record(name, seconds, nbytes=0, wait=False):
+    # 记录在别处计时的阶段，例如窗口进程或对话框内部的渲染
+    current = Span(name, nbytes, wait)
+    current.seconds = seconds
+    _finish(current)
+
+
+def _finish(current):
+    STATS.record(current.name, current.seconds, current.nbytes)
+
+    execution_spans = getattr(_local, "spans", None)
+    if execution_spans is not None:
+        execution_spans.append(current)
+
+    logger.log(logging.INFO if TRACE else logging.DEBUG, "%s %.1f ms %.1f MB%s", current.name,
+               current.seconds * 1000, current.nbytes / 1024 ** 2, " (wait)" if current.wait else "")
+
+
+def capture_next(kind):
+    # 为下一次节点执行安排一次 cProfile 或 tracemalloc 采集
+    global _capture
+    if kind not in ("cprofile", "tracemalloc", None):
+        raise ValueError(f"Unsupported capture kind: {kind}")
+    with _capture_lock:
+        _capture = kind
+
+
+def _take_capture():
+    global _capture
+    with _capture_lock:
+        kind, _capture = _capture, None
+    return kind
+
+
+@contextmanager
+def execution(name):
+    # 一次节点执行：汇总其中各 span，计算耗时与等待时间分开统计
+    if getattr(_local, "spans", None) is not None:
+        # 嵌套调用并入外层执行
+        yield
+        return
+
+    kind = _take_capture()
+    profiler = None
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif kind == "tracemalloc":
+        tracemalloc.start(25)
+
+    _local.spans = []
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - start
+        spans, _local.spans = _local.spans, None
+
+        wait = sum(s.seconds for s in spans if s.wait)
+        STATS.record(f"{name}.total", total)
+        STATS.record(f"{name}.compute", total - wait)
+        if any(s.wait for s in spans):
+            STATS.record(f"{name}.wait", wait)
+
+        logger.log(logging.INFO if TRACE else logging.DEBUG, "%s compute %.1f ms, wait %.1f ms: %s",
+                   name, (total - wait) * 1000, wait * 1000,
+                   ", ".join(f"{s.name} {s.seconds * 1000:.1f}" for s in spans))
+
+        if profiler is not None:
+            profiler.disable()
+            _save_capture(name, profiler=profiler)
+        elif kind == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _save_capture(name, snapshot=snapshot, peak=peak)
+
+
+def _save_capture(name, profiler=None, snapshot=None, peak=0):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    if profiler is not None:
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+    else:
+        path = stem + ".tracemalloc.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"peak {peak / 1024 ** 2:.1f} MB\n")
+            for stat in snapshot.statistics("lineno")[:100]:
+                f.write(f"{stat}\n")
+    logger.info("%s profile written to %s", name, path)
+
+
+def dump(path=None):
+    # 返回当前统计；给定路径时同时写成 JSON
+    summary = STATS.summary()
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,152 @@
+# 画布结果的后台写出：PNG 编码不在节点执行路径上。先写临时文件并 fsync，
+# 再原子重命名，文件名取内容哈希，返回的路径在写完之前对读者不可见
+
+import atexit
+import hashlib
+import os
+import queue
+import threading
+
+import numpy as np
+from PIL import Image
+
+from . import instrumentation
+from .instrumentation import logger
+
+OUTPUT_DIR = os.path.join(os.getcwd(), "canvas")
+
+# 可选的输出格式及扩展名；除 PNG 外均不压缩或无损压缩
+FORMATS = {
+    "png": ".png",
+    "tiff": ".tiff",
+    "bmp": ".bmp",
+    "webp": ".webp",
+    "npy": ".npy",
+}
+
+
+def content_name(array, extension=".png"):
+    # 形状也计入哈希，避免不同尺寸的相同字节流撞名
+    m = hashlib.blake2b(digest_size=16)
+    m.update(repr(array.shape).encode())
+    m.update(memoryview(array).cast("B") if array.flags.c_contiguous else array.tobytes())
+    return m.hexdigest() + extension
+
+
+def encode(array, f, output_format="png", compress_level=6):
+    if output_format == "npy":
+        # 原始数组，Snapload 可直接内存映射读取
+        np.save(f, array)
+    elif output_format == "png":
+        Image.fromarray(array).save(f, format="PNG", compress_level=compress_level)
+    elif output_format == "tiff":
+        Image.fromarray(array).save(f, format="TIFF", compression="raw")
+    elif output_format == "bmp":
+        # PIL 读取 BMP 时忽略 alpha，只写颜色通道
+        Image.fromarray(np.ascontiguousarray(array[..., :3])).save(f, format="BMP")
+    elif output_format == "webp":
+        # exact 保留透明像素的颜色，否则读回的白底会变成黑色
+        Image.fromarray(array).save(f, format="WEBP", lossless=True, exact=True, quality=0, method=0)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def write_image(array, path, output_format="png", compress_level=6):
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            encode(array, f, output_format, compress_level)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # 目录项也落盘，重命名在断电后依然有效
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(path), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class OutputWriter:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._errors = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, array, directory=OUTPUT_DIR, filename=None, output_format="png", compress_level=6):
+        # 立即返回最终路径；filename 为不含扩展名的文件名，为空时按内容命名，相同内容不重复写
+        if array.dtype != np.uint8:
+            array = (array * 255).astype(np.uint8)
+
+        extension = FORMATS[output_format]
+        os.makedirs(directory, exist_ok=True)
+        if filename:
+            name = filename + extension
+        else:
+            with instrumentation.span("write.hash", array.nbytes):
+                name = content_name(array, extension)
+        path = os.path.abspath(os.path.join(directory, name))
+
+        with self._condition:
+            if filename is None and (path in self._pending or os.path.exists(path)):
+                return path
+            self._pending[path] = self._pending.get(path, 0) + 1
+            self._errors.pop(path, None)
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="snap-output-writer", daemon=True)
+                self._thread.start()
+
+        self._queue.put((array, path, output_format, compress_level))
+        return path
+
+    def _run(self):
+        while True:
+            array, path, output_format, compress_level = self._queue.get()
+            error = None
+            try:
+                # 后台线程中的 span 只进入滚动统计，不计入节点执行时间
+                with instrumentation.span(f"write.{output_format}") as written:
+                    write_image(array, path, output_format, compress_level)
+                    written.nbytes = os.path.getsize(path)
+            except Exception as e:
+                error = e
+                logger.error("写入 %s 时出错: %s", path, e)
+
+            with self._condition:
+                if error is not None:
+                    self._errors[path] = error
+                self._pending[path] -= 1
+                if self._pending[path] == 0:
+                    del self._pending[path]
+                self._condition.notify_all()
+            self._queue.task_done()
+
+    def is_pending(self, path):
+        with self._condition:
+            return os.path.abspath(path) in self._pending
+
+    def wait(self, path, timeout=None):
+        # 等待该路径上所有排队的写入完成；不是本进程写出的路径直接返回
+        path = os.path.abspath(path)
+        with self._condition:
+            if not self._condition.wait_for(lambda: path not in self._pending, timeout):
+                raise TimeoutError(f"等待写入超时: {path}")
+            error = self._errors.pop(path, None)
+        if error is not None:
+            raise error
+
+    def flush(self):
+        self._queue.join()
+
+
+WRITER = OutputWriter()
+atexit.register(WRITER.flush)
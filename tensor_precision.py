@@ -0,0 +1,36 @@
+# IMAGE / MASK 输出精度。float32 为 ComfyUI 默认；float16 内存减半；
+# uint8 保留 8 位像素原值（0–255，MASK 同样按 255 为 1），内存为 float32 的四分之一。
+# 本包的节点都能直接接收这三种精度；uint8 输出只应接到 Snap 节点，其他节点需要浮点输入。
+
+import torch
+
+PRECISIONS = ["float32", "float16", "uint8"]
+
+_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "uint8": torch.uint8,
+}
+
+
+def dtype(precision):
+    if precision not in _DTYPES:
+        raise ValueError(f"Unsupported precision: {precision}")
+    return _DTYPES[precision]
+
+
+def full_scale(tensor_dtype):
+    # 该精度下的 1.0
+    return 255 if tensor_dtype == torch.uint8 else 1.0
+
+
+def convert(tensor, target):
+    # 转换到目标 dtype；已是目标精度时原样返回，不拷贝
+    if tensor.dtype == target:
+        return tensor
+    if tensor.dtype == torch.uint8:
+        return tensor.to(target).div_(255)
+    if target == torch.uint8:
+        return tensor.mul(255).round_().clamp_(0, 255).to(torch.uint8)
+    return tensor.to(target)
+
@@ -0,0 +1,205 @@
+# Snap Canvas 会话窗口：一次请求中的多项（批次输入的各帧）以标签页同时摆在一个窗口里，
+# 可把一项的布局套用到其余各项，逐项或一次性确认；所有项都确认后调用方得到各自的结果。
+#
+# ComfyUI 在同一个执行线程里逐个运行提示，因此会话只服务于创建它的线程：调用方在等待时运行事件循环，
+# 窗口只在有待确认项时显示，各次提示之间不需要事件循环。新项默认沿用上一次确认的布局。
+
+import threading
+
+from PyQt5.QtCore import QEventLoop, QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import (
+    QAction, QApplication, QDialog, QHBoxLayout, QMenu, QMenuBar, QMessageBox, QPushButton, QTabWidget,
+    QVBoxLayout,
+)
+
+try:
+    from .canvas_window import CanvasPanel
+except ImportError:
+    # 作为窗口进程的脚本目录直接导入
+    from canvas_window import CanvasPanel
+
+
+class CanvasRequest:
+    def __init__(self, images, export_scale=1):
+        self.images = images
+        self.export_scale = export_scale
+        self.results = [None] * len(images)
+        self.remaining = len(images)
+        # 第一项确认后确定画布尺寸，同一请求的结果要能拼成一个批次
+        self.canvas_size = None
+        self.error = None
+
+    def done(self):
+        return self.remaining == 0 or self.error is not None
+
+
+class CanvasSession(QDialog):
+    completed = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+
+        self.setWindowTitle("Snap Canvas 会话")
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.tabs = QTabWidget(self)
+        self.items = {}
+        self.last_layout = None
+        self.count = 0
+
+        self.menu_bar = QMenuBar(self)
+        help_menu = QMenu("使用说明(Help)", self)
+        self.menu_bar.addMenu(help_menu)
+        usage_action = QAction("使用方法", self)
+        usage_action.triggered.connect(self.show_usage)
+        help_menu.addAction(usage_action)
+
+        apply_button = QPushButton("当前布局应用到其余各项", self)
+        apply_button.clicked.connect(self.apply_to_rest)
+        confirm_button = QPushButton("确认当前项", self)
+        confirm_button.clicked.connect(self.confirm_current)
+        confirm_all_button = QPushButton("全部确认", self)
+        confirm_all_button.clicked.connect(self.confirm_all)
+
+        hbox = QHBoxLayout()
+        hbox.addWidget(apply_button)
+        hbox.addWidget(confirm_button)
+        hbox.addWidget(confirm_all_button)
+
+        vbox = QVBoxLayout()
+        vbox.setMenuBar(self.menu_bar)
+        vbox.addWidget(self.tabs)
+        vbox.addLayout(hbox)
+        self.setLayout(vbox)
+
+        self.setMinimumSize(600, 400)
+
+    def show_usage(self):
+        panel = self.tabs.currentWidget()
+        if panel is not None:
+            panel.show_usage()
+
+    def add_request(self, request):
+        self.count += 1
+        for index, image in enumerate(request.images):
+            panel = CanvasPanel(image, export_scale=request.export_scale)
+            if self.last_layout is not None:
+                panel.apply_layout(self.last_layout)
+            self.items[panel] = (request, index)
+
+            title = f"#{self.count}" if len(request.images) == 1 else f"#{self.count} · {index + 1}/{len(request.images)}"
+            self.tabs.addTab(panel, title)
+
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def pending_panels(self):
+        return [self.tabs.widget(i) for i in range(self.tabs.count())]
+
+    def apply_to_rest(self):
+        current = self.tabs.currentWidget()
+        if current is None:
+            return
+        layout = current.current_layout()
+        for panel in self.pending_panels():
+            if panel is not current:
+                panel.apply_layout(layout)
+
+    def confirm(self, panel):
+        request, index = self.items[panel]
+        size = (panel.canvas_width, panel.canvas_height)
+        if request.canvas_size is not None and size != request.canvas_size:
+            QMessageBox.warning(
+                self, "画布尺寸不一致",
+                f"同一批次的画布尺寸必须一致（{request.canvas_size[0]}x{request.canvas_size[1]}），"
+                "可先用“当前布局应用到其余各项”。")
+            return False
+
+        panel.save_image()
+        del self.items[panel]
+        request.canvas_size = size
+        request.results[index] = {
+            "image": panel.get_modified_image(),
+            "x": panel.get_top_left_x(),
+            "y": panel.get_top_left_y(),
+            "scale": panel.get_scale_factor(),
+            "layout": panel.get_layout(),
+            "export": panel.get_export_image(),
+            "render_seconds": panel.render_seconds,
+            "render_bytes": panel.render_bytes,
+        }
+        request.remaining -= 1
+        self.last_layout = panel.get_layout()
+
+        self.remove_panel(panel)
+        return True
+
+    def confirm_current(self):
+        panel = self.tabs.currentWidget()
+        if panel is not None:
+            self.confirm(panel)
+
+    def confirm_all(self):
+        for panel in self.pending_panels():
+            if not self.confirm(panel):
+                self.tabs.setCurrentWidget(panel)
+                break
+
+    def remove_panel(self, panel):
+        self.tabs.removeTab(self.tabs.indexOf(panel))
+        panel.deleteLater()
+        self.completed.emit()
+
+        # 没有待处理项时只隐藏窗口，下次请求直接复用
+        if self.tabs.count() == 0:
+            self.hide()
+
+    def discard_pending(self):
+        # 关闭窗口视为放弃所有未确认的项
+        for panel in self.pending_panels():
+            request, _ = self.items.pop(panel)
+            request.error = "画布窗口未保存就被关闭"
+            self.remove_panel(panel)
+
+    def closeEvent(self, event):
+        self.discard_pending()
+        event.accept()
+
+    def reject(self):
+        # Esc 走 reject() 而不经过 closeEvent，同样要让等待中的请求结束
+        self.discard_pending()
+        super().reject()
+
+    def request(self, images, export_scale=1):
+        # 提交一组图像并阻塞到它们全部被确认，按顺序返回各项的结果字典
+        if QThread.currentThread() != self.thread():
+            raise RuntimeError("Snap Canvas 会话窗口只能在创建它的线程中使用")
+
+        request = CanvasRequest(images, export_scale)
+        self.add_request(request)
+        loop = QEventLoop()
+        self.completed.connect(loop.quit)
+        try:
+            while not request.done():
+                loop.exec_()
+        finally:
+            self.completed.disconnect(loop.quit)
+
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.results
+
+
+_app = None
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # 会话窗口在第一次调用的线程中创建，之后都在该线程中使用；QApplication 需要一直持有引用
+    global _app, _session
+    with _session_lock:
+        if _session is None:
+            _app = QApplication.instance() or QApplication([])
+            _session = CanvasSession()
+        return _session
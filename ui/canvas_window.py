@@ -1,13 +1,29 @@
+import math
 import os
 import sys
 import time
+from collections import deque
+import numpy as np
+from PyQt5 import sip
 from PyQt5.QtWidgets import (
-    QApplication, QDialog, QPushButton, QVBoxLayout, QLineEdit, QHBoxLayout,
+    QApplication, QDialog, QWidget, QPushButton, QVBoxLayout, QLineEdit, QHBoxLayout,
     QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsItem, QMessageBox,
-    QMenuBar, QMenu, QAction
+    QMenuBar, QMenu, QAction, QStyle, QStyleOptionGraphicsItem
 )
-from PyQt5.QtGui import QPixmap, QImage, QColor, QPainter, QTransform
-from PyQt5.QtCore import pyqtSignal, Qt, QRectF, QPointF
+from PyQt5.QtGui import QPixmap, QImage, QColor, QPainter, QPen, QTransform
+from PyQt5.QtCore import pyqtSignal, Qt, QRectF, QPointF, QSizeF, QTimer
+
+try:
+    from . import image_bridge
+except ImportError:
+    # 作为窗口进程的脚本目录直接导入
+    import image_bridge
+
+# 高分辨率导出时每个水平条带的最大字节数
+EXPORT_TILE_BYTES = 64 * 1024 * 1024
+
+# 停止拖动/缩放多久之后切回原图平滑绘制（毫秒）
+IDLE_DELAY_MS = 200
 
 
 class CustomGraphicsView(QGraphicsView):
@@ -19,7 +35,50 @@ class CustomGraphicsView(QGraphicsView):
         self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
         self.setFocusPolicy(Qt.StrongFocus)  # 确保视图可以接收焦点
 
+        # 交互期间图像使用低分辨率代理绘制，空闲后再用原图平滑重绘
+        self.interacting = False
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.timeout.connect(self.end_interaction)
+
+        # 最近若干帧的绘制耗时（秒）
+        self.frame_times = deque(maxlen=240)
+
+    def begin_interaction(self):
+        self.interacting = True
+        self.idle_timer.start(IDLE_DELAY_MS)
+
+    def end_interaction(self):
+        self.interacting = False
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.frame_times.append(time.perf_counter() - start)
+
+    def frame_stats(self):
+        if not self.frame_times:
+            return {"frames": 0}
+        times = sorted(self.frame_times)
+        return {
+            "frames": len(times),
+            "mean_ms": sum(times) / len(times) * 1000,
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+            "max_ms": times[-1] * 1000,
+        }
+
+    def mousePressEvent(self, event):
+        self.begin_interaction()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() != Qt.NoButton:
+            self.begin_interaction()
+        super().mouseMoveEvent(event)
+
     def wheelEvent(self, event):
+        self.begin_interaction()
         modifiers = QApplication.keyboardModifiers()
         # 修改为无需按下 Alt 键即可缩放视图
         if modifiers == Qt.NoModifier:
@@ -34,23 +93,25 @@ class CustomGraphicsView(QGraphicsView):
             super().wheelEvent(event)
 
 
-class CanvasWindow(QDialog):
-    save_signal = pyqtSignal()
-    close_signal = pyqtSignal()
-
-    def __init__(self, input_image, canvas_width=512, canvas_height=512):
-        super().__init__()
+class CanvasPanel(QWidget):
+    # 单个图像的画布：场景、视图和编辑控件。CanvasWindow 中只有一个，会话窗口中每个请求一个
+    def __init__(self, input_image, canvas_width=512, canvas_height=512, export_scale=1, parent=None):
+        super().__init__(parent)
 
-        self.setWindowTitle("Snap Canvas")
-        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
         self.input_image = input_image
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
         self.modified_image = None
+        self.export_scale = export_scale  # 保存时额外导出 N 倍画布尺寸的图像
+        self.export_image = None
 
         self.top_left_x = 0
         self.top_left_y = 0
         self.scale_factor = 1.0  # 初始缩放倍数
+        self.saved_layout = None  # 保存时记录的布局，可用于无界面重放
+        # 保存时渲染所用的时间和输出字节数，调用方据此把渲染与等待用户的时间分开统计
+        self.render_seconds = 0.0
+        self.render_bytes = 0
 
         self.scene = QGraphicsScene()
         # 使用自定义的视图
@@ -81,20 +142,7 @@ class CanvasWindow(QDialog):
         # 设置旋转锚点为图像中心
         self.input_pixmap_item.setTransformOriginPoint(self.input_pixmap_item.boundingRect().center())
 
-        # 创建菜单栏
-        self.menu_bar = QMenuBar(self)
-        help_menu = QMenu("使用说明(Help)", self)
-        self.menu_bar.addMenu(help_menu)
-
-        # 创建“使用方法”动作
-        usage_action = QAction("使用方法", self)
-        usage_action.triggered.connect(self.show_usage)
-        help_menu.addAction(usage_action)
-
         # 创建按钮和输入框
-        save_button = QPushButton("保存并关闭", self)
-        save_button.clicked.connect(self.save_and_close)
-
         rotate_label = QLineEdit(self)
         rotate_label.setPlaceholderText("旋转角度 (°)")
         rotate_label.setFixedWidth(100)
@@ -132,19 +180,15 @@ class CanvasWindow(QDialog):
         hbox.addWidget(scale_button)
 
         vbox = QVBoxLayout()
-        vbox.setMenuBar(self.menu_bar)  # 将菜单栏添加到布局中
+        vbox.setContentsMargins(0, 0, 0, 0)
         vbox.addWidget(self.view)
         vbox.addLayout(hbox)
-        vbox.addWidget(save_button)
 
         self.setLayout(vbox)
 
         self.scene.setSceneRect(0, 0, self.canvas_width, self.canvas_height)
         self.view.setSceneRect(0, 0, self.canvas_width, self.canvas_height)
 
-        # 设置窗口最小大小
-        self.setMinimumSize(600, 400)
-
     def show_usage(self):
         usage_text = (
             "使用方法：\n"
@@ -158,20 +202,20 @@ class CanvasWindow(QDialog):
         )
         QMessageBox.information(self, "使用方法", usage_text)
 
-    def save_and_close(self):
-        self.save_image()
-        self.accept()
-
     def save_image(self):
-        # 创建一个与画布大小相同的图像
-        image = QImage(self.canvas_width, self.canvas_height, QImage.Format_RGB888)
-        image.fill(QColor('white'))
+        start = time.perf_counter()
+
+        # 创建一个与画布大小相同的透明图像（预乘 RGBA），alpha 即图像的覆盖范围
+        image = QImage(self.canvas_width, self.canvas_height, QImage.Format_RGBA8888_Premultiplied)
+        image.fill(Qt.transparent)
 
         painter = QPainter(image)
         target_rect = QRectF(0, 0, self.canvas_width, self.canvas_height)
 
-        # 渲染场景
+        # 渲染场景时隐藏白色画布，只留下图像本身
+        self.canvas_pixmap_item.setVisible(False)
         self.scene.render(painter, target_rect, self.scene.sceneRect(), Qt.IgnoreAspectRatio)
+        self.canvas_pixmap_item.setVisible(True)
 
         painter.end()
 
@@ -185,9 +229,69 @@ class CanvasWindow(QDialog):
         # 获取缩放倍数
         self.scale_factor = self.input_pixmap_item.current_scale
 
-    def closeEvent(self, event):
-        self.close_signal.emit()
-        event.accept()
+        if self.export_scale > 1:
+            self.export_image = self.render_export(self.export_scale)
+
+        self.render_seconds += time.perf_counter() - start
+        self.render_bytes = image.sizeInBytes()
+        if self.export_image is not None:
+            self.render_bytes += self.export_image.nbytes
+
+        # 记录完整布局（未取整的左上角坐标），供 canvas_layout 重放
+        self.saved_layout = self.current_layout()
+
+    def current_layout(self):
+        top_left_point = self.input_pixmap_item.mapToScene(0, 0)
+        return {
+            "canvas_width": self.canvas_width,
+            "canvas_height": self.canvas_height,
+            "x": top_left_point.x(),
+            "y": top_left_point.y(),
+            "scale": self.input_pixmap_item.current_scale,
+            "rotation": self.input_pixmap_item.current_rotation,
+        }
+
+    def apply_layout(self, layout):
+        # 套用另一项的布局：画布尺寸、缩放、旋转，并让图像左上角落在同一位置
+        if (layout["canvas_width"], layout["canvas_height"]) != (self.canvas_width, self.canvas_height):
+            self.canvas_width_input.setText(str(layout["canvas_width"]))
+            self.canvas_height_input.setText(str(layout["canvas_height"]))
+            self.resize_canvas(layout["canvas_width"], layout["canvas_height"])
+
+        item = self.input_pixmap_item
+        item.current_scale = layout["scale"]
+        item.current_rotation = layout["rotation"]
+        item.update_transform()
+
+        item.setPos(0, 0)
+        origin = item.mapToScene(0, 0)
+        item.setPos(layout["x"] - origin.x(), layout["y"] - origin.y())
+
+    def render_export(self, export_scale, tile_bytes=EXPORT_TILE_BYTES):
+        # 场景中的输入图像保持原始分辨率，按 N 倍画布尺寸逐条带重新渲染；
+        # 每个条带的 QImage 直接指向输出数组对应的行，绘制结果无需再拷贝。
+        # 与 save_image 相同在透明背景上渲染，每个条带渲染后即把颜色合成到白底、保留 alpha
+        width = int(round(self.canvas_width * export_scale))
+        height = int(round(self.canvas_height * export_scale))
+        output = np.empty((height, width, 4), dtype=np.uint8)
+
+        self.canvas_pixmap_item.setVisible(False)
+        rows = max(1, tile_bytes // (width * 4))
+        for top in range(0, height, rows):
+            band = output[top:top + rows]
+            band_height = band.shape[0]
+
+            tile = QImage(sip.voidptr(band.ctypes.data), width, band_height, band.strides[0],
+                          QImage.Format_RGBA8888_Premultiplied)
+            tile.fill(Qt.transparent)
+
+            painter = QPainter(tile)
+            source_rect = QRectF(0, top / export_scale, self.canvas_width, band_height / export_scale)
+            self.scene.render(painter, QRectF(0, 0, width, band_height), source_rect, Qt.IgnoreAspectRatio)
+            painter.end()
+            image_bridge.matte_on_white(band)
+        self.canvas_pixmap_item.setVisible(True)
+        return output
 
     def set_canvas_size(self):
         try:
@@ -196,7 +300,9 @@ class CanvasWindow(QDialog):
         except ValueError:
             QMessageBox.warning(self, "输入错误", "画布宽度和高度必须是整数。")
             return
+        self.resize_canvas(width, height)
 
+    def resize_canvas(self, width, height):
         # 更新画布宽度和高度
         self.canvas_width = width
         self.canvas_height = height
@@ -239,6 +345,60 @@ class CanvasWindow(QDialog):
     def get_scale_factor(self):
         return self.scale_factor
 
+    def get_layout(self):
+        return self.saved_layout
+
+    def get_export_image(self):
+        return self.export_image
+
+
+class CanvasWindow(QDialog):
+    save_signal = pyqtSignal()
+    close_signal = pyqtSignal()
+
+    def __init__(self, input_image, canvas_width=512, canvas_height=512, export_scale=1):
+        super().__init__()
+
+        self.setWindowTitle("Snap Canvas")
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.panel = CanvasPanel(input_image, canvas_width, canvas_height, export_scale, self)
+
+        # 创建菜单栏
+        self.menu_bar = QMenuBar(self)
+        help_menu = QMenu("使用说明(Help)", self)
+        self.menu_bar.addMenu(help_menu)
+
+        # 创建“使用方法”动作
+        usage_action = QAction("使用方法", self)
+        usage_action.triggered.connect(self.panel.show_usage)
+        help_menu.addAction(usage_action)
+
+        save_button = QPushButton("保存并关闭", self)
+        save_button.clicked.connect(self.save_and_close)
+
+        vbox = QVBoxLayout()
+        vbox.setMenuBar(self.menu_bar)  # 将菜单栏添加到布局中
+        vbox.addWidget(self.panel)
+        vbox.addWidget(save_button)
+        self.setLayout(vbox)
+
+        # 设置窗口最小大小
+        self.setMinimumSize(600, 400)
+
+    def __getattr__(self, name):
+        # 画布的状态和操作都在 CanvasPanel 上，窗口沿用原有的属性与方法名
+        if name == "panel":
+            raise AttributeError(name)
+        return getattr(self.panel, name)
+
+    def save_and_close(self):
+        self.panel.save_image()
+        self.accept()
+
+    def closeEvent(self, event):
+        self.close_signal.emit()
+        event.accept()
+
 
 class ResizablePixmapItem(QGraphicsPixmapItem):
     def __init__(self, pixmap):
@@ -256,6 +416,49 @@ class ResizablePixmapItem(QGraphicsPixmapItem):
         self.min_scale = 0.1
         self.max_scale = 10.0
 
+        # 代理金字塔：第 k 层为原图的 1/2^k，交互中需要时才逐层生成
+        self.use_proxy = True
+        self.proxy_levels = [pixmap]
+        self.min_proxy_side = 64
+
+    def proxy_level(self, level):
+        levels = self.proxy_levels
+        while len(levels) <= level and min(levels[-1].width(), levels[-1].height()) >= self.min_proxy_side * 2:
+            previous = levels[-1]
+            levels.append(previous.scaled(
+                previous.width() // 2, previous.height() // 2,
+                Qt.IgnoreAspectRatio, Qt.SmoothTransformation,
+            ))
+        return levels[min(level, len(levels) - 1)]
+
+    def paint(self, painter, option, widget=None):
+        # 只在视图交互期间使用代理；保存/导出时 widget 为空，始终绘制原图
+        view = widget.parent() if widget is not None else None
+        if not (self.use_proxy and getattr(view, "interacting", False)):
+            super().paint(painter, option, widget)
+            return
+
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = 0 if lod >= 1 else int(math.log2(1 / lod))
+
+        proxy = self.proxy_level(level)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        # boundingRect 因可选中而向外多出半个像素，代理按原图实际所占的矩形绘制
+        target = QRectF(self.offset(), QSizeF(self.pixmap().size()))
+        painter.drawPixmap(target, proxy, QRectF(proxy.rect()))
+        if option.state & QStyle.State_Selected:
+            self.paint_selection(painter, option, target)
+
+    def paint_selection(self, painter, option, rect):
+        # 与 QGraphicsPixmapItem 自带的选中框相同：反差色实线打底，再画前景色虚线
+        foreground = option.palette.windowText().color()
+        background = QColor(*(0 if c > 127 else 255 for c in (foreground.red(), foreground.green(), foreground.blue())))
+        painter.setBrush(Qt.NoBrush)
+        painter.setPen(QPen(background, 0, Qt.SolidLine))
+        painter.drawRect(rect)
+        painter.setPen(QPen(option.palette.windowText(), 0, Qt.DashLine))
+        painter.drawRect(rect)
+
     def scale_pixmap(self, scale_factor):
         if self.min_scale <= scale_factor <= self.max_scale:
             self.current_scale = scale_factor
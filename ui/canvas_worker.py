@@ -0,0 +1,152 @@
+# Snap Canvas 常驻窗口进程，由 canvas_process 启动。QApplication 只创建一次，
+# 之后每个请求只新建窗口；输入和结果图像都放在共享内存中
+
+import os
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+# 作为独立脚本运行，直接从本目录导入窗口模块
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from canvas_window import CanvasWindow  # noqa: E402
+import canvas_session  # noqa: E402
+import image_bridge  # noqa: E402
+
+AUTHKEY_ENV = "SNAP_CANVAS_AUTHKEY"
+
+# 已发布、等待服务进程拷贝的结果。Windows 上共享内存在最后一个句柄关闭时即被释放，
+# 所以句柄要保留到服务进程发来 release 之后才关闭
+_published = []
+
+
+def untrack(shm):
+    # 共享内存由服务进程负责解除链接，取消本进程的资源跟踪，避免退出时被提前回收；
+    # 只有 POSIX 上有 resource_tracker
+    if os.name == "posix":
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def publish(array):
+    # 结果放进新建的共享内存，由服务进程拷贝后解除链接
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=np.uint8, buffer=shm.buf)[...] = array
+    untrack(shm)
+    _published.append(shm)
+    return shm.name, array.shape
+
+
+def release(discard=False):
+    # discard: 服务进程不会再拷贝这些结果（出错或退出），由本进程解除链接
+    while _published:
+        shm = _published.pop()
+        shm.close()
+        if discard:
+            shm.unlink()
+
+
+def publish_item(modified_image, export_image, **fields):
+    # 一项结果：图像放进共享内存，其余字段原样返回
+    return dict(
+        fields,
+        image=publish(image_bridge.qimage_to_rgba(modified_image)),
+        export=publish(export_image) if export_image is not None else None,
+    )
+
+
+def open_canvas(request):
+    shm = shared_memory.SharedMemory(name=request["name"])
+    try:
+        # 本进程只读取输入，共享内存由服务进程负责解除链接
+        untrack(shm)
+        image = np.ndarray(request["shape"], dtype=np.uint8, buffer=shm.buf)
+        qimage = image_bridge.numpy_to_qimage(image)
+
+        dialog = CanvasWindow(qimage, export_scale=request["export_scale"])
+        dialog.exec_()
+
+        modified_image = dialog.get_modified_image()
+        if modified_image is None:
+            reply = {"error": "画布窗口未保存就被关闭"}
+        else:
+            reply = {"items": [publish_item(
+                modified_image, dialog.get_export_image(),
+                x=dialog.get_top_left_x(),
+                y=dialog.get_top_left_y(),
+                scale=dialog.get_scale_factor(),
+                layout=dialog.get_layout(),
+                render_seconds=dialog.render_seconds,
+                render_bytes=dialog.render_bytes,
+            )]}
+        dialog.deleteLater()
+
+        # 释放所有引用输入缓冲区的对象后才能关闭共享内存
+        del dialog, qimage, image
+        return reply
+    finally:
+        shm.close()
+
+
+def open_session(request):
+    shm = shared_memory.SharedMemory(name=request["name"])
+    try:
+        untrack(shm)
+        images = np.ndarray(request["shape"], dtype=np.uint8, buffer=shm.buf)
+        # 会话窗口中的画布可能晚于本次请求才销毁，各帧传入拷贝，不引用共享内存
+        qimages = [image_bridge.numpy_to_qimage(frame).copy() for frame in images]
+        del images
+    finally:
+        shm.close()
+
+    try:
+        results = canvas_session.get_session().request(qimages, request["export_scale"])
+    except RuntimeError as e:
+        return {"error": str(e)}
+    return {"items": [publish_item(result.pop("image"), result.pop("export"), **result) for result in results]}
+
+
+def main():
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    listener = Listener(("127.0.0.1", 0), authkey=authkey)
+
+    # 第一行报告监听地址，之后的输出都转到标准错误
+    host, port = listener.address
+    sys.stdout.write(f"{host}:{port}\n")
+    sys.stdout.flush()
+    sys.stdout = sys.stderr
+
+    app = QApplication.instance() or QApplication([])
+    app.setQuitOnLastWindowClosed(False)
+
+    connection = listener.accept()
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request["command"] == "quit":
+            break
+        if request["command"] == "release":
+            # 服务进程已拷贝上一次的结果
+            release()
+            continue
+
+        try:
+            reply = open_session(request) if request["command"] == "session" else open_canvas(request)
+        except Exception as e:
+            # 出错时服务进程不会拷贝，已发布的部分结果直接释放
+            release(discard=True)
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        connection.send(reply)
+        app.processEvents()
+
+    release(discard=True)
+    connection.close()
+    listener.close()
+
+
+if __name__ == "__main__":
+    main()
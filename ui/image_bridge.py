@@ -0,0 +1,166 @@
+# 张量 / NumPy 与 QImage 之间的直接转换，不经过 PNG 编解码。
+# Qt 只在用到 QImage 的函数里导入，服务进程只做张量 / uint8 转换时不会加载 Qt
+
+import functools
+
+import numpy as np
+import torch
+
+# tensor_to_uint8 按行带转换，单个浮点临时块的上限
+_BAND_BYTES = 16 * 1024 * 1024
+
+
+def numpy_to_qimage(array):
+    # array 为 HxW 或 HxWxC 的 uint8 数组；QImage 直接引用其内存，不做拷贝
+    from PyQt5.QtGui import QImage
+
+    formats = {
+        1: QImage.Format_Grayscale8,
+        3: QImage.Format_RGB888,
+        4: QImage.Format_RGBA8888,
+    }
+
+    if array.ndim == 2:
+        array = array[:, :, None]
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width, channels = array.shape
+    if channels not in formats:
+        raise ValueError(f"Unsupported number of channels: {channels}")
+
+    qimage = QImage(array.data, width, height, array.strides[0], formats[channels])
+    # QImage 不持有外部缓冲区，挂在对象上保证其生命周期
+    qimage._buffer = array
+    return qimage
+
+
+def tensor_to_uint8(tensor):
+    # 接受 HWC / CHW（可带批次维），返回 HxWx3 的 uint8 数组
+    if tensor.ndim == 4:
+        tensor = tensor.squeeze(0)
+    if tensor.ndim != 3:
+        raise ValueError(f"Expected tensor with 3 dimensions, but got {tensor.ndim} dimensions.")
+
+    if tensor.shape[-1] in [1, 3, 4]:
+        pass
+    elif tensor.shape[0] in [1, 3, 4]:
+        tensor = tensor.permute(1, 2, 0)
+    else:
+        raise ValueError("Tensor has unsupported shape.")
+
+    num_channels = tensor.shape[-1]
+    if num_channels == 1:
+        tensor = tensor.expand(-1, -1, 3)
+    elif num_channels == 2:
+        tensor = torch.cat([tensor, tensor[:, :, 0:1]], dim=2)
+    elif num_channels == 4:
+        tensor = tensor[:, :, :3]
+    elif num_channels != 3:
+        raise ValueError(f"Unsupported number of channels: {num_channels}")
+
+    if tensor.dtype == torch.uint8:
+        return np.ascontiguousarray(tensor.cpu().numpy())
+
+    # 逐行带乘 255 后直接写入 uint8 输出，浮点临时张量不超过 _BAND_BYTES
+    height, width = tensor.shape[:2]
+    output = torch.empty((height, width, 3), dtype=torch.uint8)
+    rows = max(1, _BAND_BYTES // (width * 3 * 4))
+    for top in range(0, height, rows):
+        output[top:top + rows].copy_(tensor[top:top + rows].mul(255))
+    return output.numpy()
+
+
+def tensor_to_qimage(tensor):
+    return numpy_to_qimage(tensor_to_uint8(tensor))
+
+
+def qimage_view(qimage, format=None, channels=3):
+    # 返回按 bytesPerLine 正确处理行对齐的只读视图，生命周期依赖返回的 QImage
+    from PyQt5.QtGui import QImage
+
+    qimage = qimage.convertToFormat(QImage.Format_RGB888 if format is None else format)
+    width = qimage.width()
+    height = qimage.height()
+    stride = qimage.bytesPerLine()
+
+    ptr = qimage.constBits()
+    ptr.setsize(stride * height)
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape((height, stride))
+    return rows[:, :width * channels].reshape((height, width, channels)), qimage
+
+
+def qimage_to_numpy(qimage):
+    view, _ = qimage_view(qimage)
+    return view.copy()
+
+
+def qimage_to_rgba(qimage):
+    # 透明背景的画布结果 → HxWx4：颜色合成到白底，alpha 保留覆盖范围
+    from PyQt5.QtGui import QImage
+
+    view, _ = qimage_view(qimage, QImage.Format_RGBA8888_Premultiplied, channels=4)
+    return matte_on_white(view.copy())
+
+
+def matte_on_white(array):
+    # 原地把预乘 RGBA 的颜色合成到白底：预乘颜色 c ≤ a，c + (255 - a) 不会溢出
+    array[..., :3] += 255 - array[..., 3:]
+    return array
+
+
+def rgba_to_tensors(array, dtype=torch.float32):
+    # 白底 RGBA → IMAGE (1, H, W, 3) 与 MASK (1, H, W)，MASK 与 Snapload 一致取 1 - alpha
+    image = uint8_to_tensor(array[..., :3], dtype)
+    mask = torch.empty((1,) + array.shape[:2], dtype=dtype)
+    write_inverted_alpha(array[..., 3], mask[0])
+    return image, mask
+
+
+def uint8_to_tensor(array, dtype=torch.float32):
+    # 直接把 8 位像素写入预分配的张量，只有这一次拷贝
+    tensor = torch.empty((1,) + array.shape, dtype=dtype)
+    write_uint8(array, tensor[0])
+    return tensor
+
+
+def write_uint8(array, out):
+    # 8 位像素写入 out：uint8 原值拷贝，float32 除以 255，其余浮点类型查表，都不生成 float32 临时数组
+    out_np = out.numpy()
+    if out_np.dtype == np.uint8:
+        np.copyto(out_np, array)
+    elif out_np.dtype == np.float32:
+        np.divide(array, np.float32(255.0), out=out_np, dtype=np.float32)
+    else:
+        # NumPy 的 float16 运算逐元素转换，很慢；256 项的表与先算 float32 再转换的结果相同
+        _lookup_into(_lookup_table(out_np.dtype), array, out_np)
+
+
+def write_inverted_alpha(alpha, out):
+    # MASK = 1 - alpha；uint8 精度下为 255 - alpha
+    out_np = out.numpy()
+    if out_np.dtype == np.uint8:
+        np.subtract(np.uint8(255), alpha, out=out_np)
+    elif out_np.dtype == np.float32:
+        write_uint8(alpha, out)
+        np.subtract(np.float32(1.0), out_np, out=out_np)
+    else:
+        _lookup_into(_lookup_table(out_np.dtype, inverted=True), alpha, out_np)
+
+
+def _lookup_into(table, array, out):
+    # take 会把 uint8 下标转成 int64 临时数组，按行带处理，临时数组不超过 _BAND_BYTES
+    rows = max(1, _BAND_BYTES // (array[:1].size * 8))
+    for top in range(0, array.shape[0], rows):
+        np.take(table, array[top:top + rows], out=out[top:top + rows], mode="clip")
+
+
+@functools.lru_cache(maxsize=None)
+def _lookup_table(dtype, inverted=False):
+    values = np.arange(256, dtype=np.float32) / np.float32(255.0)
+    if inverted:
+        values = np.float32(1.0) - values
+    return values.astype(dtype)
+
+
+def qimage_to_tensor(qimage):
+    view, _ = qimage_view(qimage)
+    return uint8_to_tensor(view)